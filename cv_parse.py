@@ -1,20 +1,47 @@
-from docx import Document
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional, Union
+from functools import cached_property
+from typing import List, Dict, Any, Optional, Union, BinaryIO
 import re
-import spacy
 import io
-from transformers import MT5ForConditionalGeneration, MT5Tokenizer
-import torch
-import pdfplumber
+import os
+import hashlib
+import asyncio
+import threading
+from concurrent.futures import Executor
 from mongodb import Database
 
-# spaCy modelini yükle
-try:
-    nlp = spacy.load("tr_core_news_trf")
-except OSError:
-    print("Türkçe spaCy modeli bulunamadı. Lütfen 'python -m spacy download tr_core_news_trf' komutunu çalıştırın.")
-    nlp = None
+# Ağır bağımlılıklar ilk kullanımda yüklenir (uvicorn açılışını ve --reload'u hızlandırır)
+_pdfplumber = None
+_Document = None
+_nlp = None
+_nlp_loaded = False
+_nlp_lock = threading.Lock()
+
+def _get_nlp():
+    """spaCy Türkçe modelini ilk çağrıda yükle"""
+    global _nlp, _nlp_loaded
+    if not _nlp_loaded:
+        # Thread havuzundaki eşzamanlı ilk çağrılar modeli iki kez yüklemesin
+        with _nlp_lock:
+            if not _nlp_loaded:
+                try:
+                    import spacy
+                    _nlp = spacy.load("tr_core_news_trf")
+                except OSError:
+                    print("Türkçe spaCy modeli bulunamadı. Lütfen 'python -m spacy download tr_core_news_trf' komutunu çalıştırın.")
+                    _nlp = None
+                _nlp_loaded = True
+    return _nlp
+
+# Skill adaylarındaki '.' ve '(' karakterlerini tek geçişte saymak için
+_PUNCT_TABLE = str.maketrans('', '', '.(')
+
+# Dosya uzantısı -> (content type, metne çevirme metodu)
+_EXT_DISPATCH = {
+    '.pdf': ('application/pdf', 'pdf_to_text'),
+    '.docx': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'doc_to_text'),
+    '.doc': ('application/msword', 'doc_to_text'),
+}
 
 @dataclass
 class CVInfo:
@@ -30,34 +57,44 @@ class CVSummarizer:
     
     def __init__(self, model_name: str = "ozcangundes/mt5-small-turkish-summarization"):
         self.model_name = model_name
-        self.tokenizer = None
-        self.model = None
-        self.model_loaded = False
-        self._load_model()
     
-    def _load_model(self):
-        """Modeli ve tokenizer'ı yükle"""
+    @cached_property
+    def _model_bundle(self):
+        """Modeli ve tokenizer'ı ilk özetleme isteğinde yükle"""
         try:
             print("T5 özetleme modeli yükleniyor...")
-            self.tokenizer = MT5Tokenizer.from_pretrained(self.model_name)
-            self.model = MT5ForConditionalGeneration.from_pretrained(self.model_name)
+            import torch
+            from transformers import MT5ForConditionalGeneration, MT5Tokenizer
+            
+            tokenizer = MT5Tokenizer.from_pretrained(self.model_name)
+            model = MT5ForConditionalGeneration.from_pretrained(self.model_name)
             
             # GPU varsa kullan
             if torch.cuda.is_available():
-                self.model = self.model.cuda()
+                model = model.cuda()
                 print("Model GPU'ya yüklendi")
             else:
                 print("Model CPU'da çalışacak")
                 
-            self.model_loaded = True
             print("T5 modeli başarıyla yüklendi")
+            return tokenizer, model
                 
         except Exception as e:
             print(f"T5 model yükleme hatası: {e}")
             print("Basit özetleme moduna geçiliyor...")
-            self.tokenizer = None
-            self.model = None
-            self.model_loaded = False
+            return None, None
+    
+    @property
+    def tokenizer(self):
+        return self._model_bundle[0]
+    
+    @property
+    def model(self):
+        return self._model_bundle[1]
+    
+    @property
+    def model_loaded(self) -> bool:
+        return self.model is not None and self.tokenizer is not None
     
     def summarize_cv(self, cv_text: str, max_length: int = 200, min_length: int = 50) -> str:
         """CV metnini özetle"""
@@ -65,6 +102,8 @@ class CVSummarizer:
             return self._simple_summarize(cv_text)
         
         try:
+            import torch
+            
             # Metni temizle ve hazırla
             cleaned_text = self._prepare_text_for_summarization(cv_text)
             
@@ -202,10 +241,41 @@ class CVExtractor:
             r'\d{4}\s*-\s*[Dd]evam',  # 2020 - Devam
             r'\d{4}\s*-\s*[Gg]ünümüz',  # 2020 - Günümüz
         ]
+        
+        # Bölüm başlıkları - her satır tek geçişte bu gruplardan birine etiketlenir
+        section_headers = {
+            'education': [
+                'eğitim', 'education', 'öğrenim', 'akademik', 'academic',
+                'eğitim bilgileri', 'educational background', 'qualifications'
+            ],
+            'experience': [
+                'deneyim', 'experience', 'tecrübe', 'iş deneyimi', 'work experience',
+                'kariyer', 'career', 'professional experience', 'çalışma geçmişi',
+                'employment', 'employment history', 'work history'
+            ],
+            'skills': [
+                'yetenekler', 'skills', 'beceriler', 'competencies', 'abilities',
+                'yetenek', 'skill', 'beceri', 'teknolojiler', 'technologies',
+                'araçlar', 'tools', 'diller', 'languages', 'programlama', 'programming'
+            ],
+            'other': [
+                'projeler', 'projects', 'sertifika', 'certificates', 'referans', 'references',
+                'iletişim', 'contact', 'kişisel', 'personal', 'özet', 'summary',
+                'hobiler', 'hobbies', 'dil', 'languages'
+            ]
+        }
+        self._section_header_re = re.compile('|'.join(
+            f"(?P<{label}>{'|'.join(re.escape(h) for h in sorted(headers, key=len, reverse=True))})"
+            for label, headers in section_headers.items()
+        ))
+        
+        # Bölüm başına alınacak maksimum satır sayısı
+        self.section_line_limits = {'education': 15, 'experience': 20, 'skills': 10}
 
-    def extract_names(self, text: str) -> List[str]:
+    def extract_names(self, text: str, lines: Optional[List[str]] = None) -> List[str]:
         """İsim soyisim çıkarma - NER + regex ile"""
         names = []
+        nlp = _get_nlp()
         
         if nlp:
             # NER ile PERSON entityleri
@@ -219,8 +289,9 @@ class CVExtractor:
                         names.append(name)
         
         # Başından regex ile 2-4 kelimelik isim arama
-        lines = text.split('\n')[:10]
-        for line in lines:
+        if lines is None:
+            lines = text.split('\n')
+        for line in lines[:10]:
             line = line.strip()
             # Her kelime büyük harfle başlar, 2-4 kelime, sadece harflerden oluşur
             name_pattern = r'^([A-ZÇĞİÖŞÜ][a-zçğıöşü]+(?:\s+[A-ZÇĞİÖŞÜ][a-zçğıöşü]+){1,3})$'
@@ -232,63 +303,67 @@ class CVExtractor:
         
         return list(set(names))
 
-    def extract_education(self, text: str) -> List[Dict[str, str]]:
+    def _section_label(self, line: str) -> Optional[str]:
+        """Satır bir bölüm başlığıysa etiketini döndür"""
+        # Başlıklar en fazla 4 kelimedir; uzun satırları bölmeden/küçültmeden ele
+        if len(line.split(maxsplit=4)) > 4:
+            return None
+        
+        match = self._section_header_re.search(line.lower())
+        return match.lastgroup if match else None
+    
+    def _scan_sections(self, lines: List[str]) -> Dict[str, List[str]]:
+        """
+        Satırları tek geçişte dolaşıp bölüm başlıklarına göre etiketle ve
+        eğitim/deneyim/beceri bölümlerinin içeriklerini topla
+        """
+        sections = {label: [] for label in self.section_line_limits}
+        current_label = None
+        buffer = []
+        
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            
+            label = self._section_label(line)
+            
+            # Yeni bölüm başladı: önceki bölümü kaydet
+            if label is not None:
+                if current_label in sections and buffer:
+                    sections[current_label].append('\n'.join(buffer))
+                current_label = label
+                buffer = []
+                continue
+            
+            # Dolmuş bölümün kalan satırları sadece başlık için kontrol edilir
+            if current_label in sections and len(buffer) < self.section_line_limits[current_label]:
+                buffer.append(line)
+        
+        if current_label in sections and buffer:
+            sections[current_label].append('\n'.join(buffer))
+        
+        return sections
+    
+    def extract_education(self, text: str, lines: Optional[List[str]] = None,
+                          sections: Optional[Dict[str, List[str]]] = None) -> List[Dict[str, str]]:
         """Eğitim bilgilerini çıkarma"""
         education = []
+        if lines is None:
+            lines = text.split('\n')
+        if sections is None:
+            sections = self._scan_sections(lines)
         
-        # Eğitim bölümlerini bul
-        education_sections = self._find_education_sections(text)
-        
-        for section in education_sections:
+        for section in sections['education']:
             edu_entries = self._parse_education_entries(section)
             education.extend(edu_entries)
         
         # Eğer bölüm bulunamazsa, satır satır ara
         if not education:
-            education = self._extract_education_line_by_line(text)
+            education = self._extract_education_line_by_line(lines)
         
         return education
     
-    def _find_education_sections(self, text: str) -> List[str]:
-        """Eğitim bölümlerini tespit et"""
-        sections = []
-        lines = text.split('\n')
-        
-        education_section_headers = [
-            'eğitim', 'education', 'öğrenim', 'akademik', 'academic',
-            'eğitim bilgileri', 'educational background', 'qualifications'
-        ]
-        
-        for i, line in enumerate(lines):
-            line_clean = line.strip().lower()
-            
-            # Başlık satırı mı kontrol et
-            if (any(header in line_clean for header in education_section_headers) and 
-                len(line_clean.split()) <= 3):
-                
-                # Bu bölümün içeriğini topla
-                section_content = []
-                j = i + 1
-                
-                while j < len(lines) and len(section_content) < 15:
-                    next_line = lines[j].strip()
-                    
-                    if not next_line:
-                        j += 1
-                        continue
-                    
-                    # Yeni bölüm başladı mı?
-                    if self._is_new_section_header(next_line):
-                        break
-                    
-                    section_content.append(next_line)
-                    j += 1
-                
-                if section_content:
-                    sections.append('\n'.join(section_content))
-        
-        return sections
-    
     def _parse_education_entries(self, section_text: str) -> List[Dict[str, str]]:
         """Eğitim bölümünden entry'leri çıkar"""
         entries = []
@@ -389,10 +464,9 @@ class CVExtractor:
         
         return edu_info
     
-    def _extract_education_line_by_line(self, text: str) -> List[Dict[str, str]]:
+    def _extract_education_line_by_line(self, lines: List[str]) -> List[Dict[str, str]]:
         """Satır satır eğitim arama (fallback)"""
         education = []
-        lines = text.split('\n')
         
         for line in lines:
             line = line.strip()
@@ -462,64 +536,25 @@ class CVExtractor:
         
         return None
 
-    def extract_experience(self, text: str) -> List[Dict[str, str]]:
+    def extract_experience(self, text: str, lines: Optional[List[str]] = None,
+                           sections: Optional[Dict[str, List[str]]] = None) -> List[Dict[str, str]]:
         """Deneyim ve tecrübe bilgilerini çıkarma"""
         experience = []
+        if lines is None:
+            lines = text.split('\n')
+        if sections is None:
+            sections = self._scan_sections(lines)
         
-        # Deneyim bölümlerini bul
-        experience_sections = self._find_experience_sections(text)
-        
-        for section in experience_sections:
+        for section in sections['experience']:
             exp_entries = self._parse_experience_entries(section)
             experience.extend(exp_entries)
         
         # Eğer bölüm bulunamazsa, satır satır ara
         if not experience:
-            experience = self._extract_experience_line_by_line(text)
+            experience = self._extract_experience_line_by_line(lines)
         
         return experience
     
-    def _find_experience_sections(self, text: str) -> List[str]:
-        """Deneyim bölümlerini tespit et"""
-        sections = []
-        lines = text.split('\n')
-        
-        experience_section_headers = [
-            'deneyim', 'experience', 'tecrübe', 'iş deneyimi', 'work experience',
-            'kariyer', 'career', 'professional experience', 'çalışma geçmişi',
-            'employment', 'employment history', 'work history'
-        ]
-        
-        for i, line in enumerate(lines):
-            line_clean = line.strip().lower()
-            
-            # Başlık satırı mı kontrol et
-            if (any(header in line_clean for header in experience_section_headers) and 
-                len(line_clean.split()) <= 4):
-                
-                # Bu bölümün içeriğini topla
-                section_content = []
-                j = i + 1
-                
-                while j < len(lines) and len(section_content) < 20:
-                    next_line = lines[j].strip()
-                    
-                    if not next_line:
-                        j += 1
-                        continue
-                    
-                    # Yeni bölüm başladı mı?
-                    if self._is_new_section_header(next_line):
-                        break
-                    
-                    section_content.append(next_line)
-                    j += 1
-                
-                if section_content:
-                    sections.append('\n'.join(section_content))
-        
-        return sections
-    
     def _parse_experience_entries(self, section_text: str) -> List[Dict[str, str]]:
         """Deneyim bölümünden entry'leri çıkar"""
         entries = []
@@ -669,10 +704,9 @@ class CVExtractor:
         
         return exp_info
     
-    def _extract_experience_line_by_line(self, text: str) -> List[Dict[str, str]]:
+    def _extract_experience_line_by_line(self, lines: List[str]) -> List[Dict[str, str]]:
         """Satır satır deneyim arama (fallback)"""
         experience = []
-        lines = text.split('\n')
         
         for line in lines:
             line = line.strip()
@@ -691,21 +725,6 @@ class CVExtractor:
         
         return experience
     
-    def _is_new_section_header(self, line: str) -> bool:
-        """Bu satır yeni bölüm başlığı mı?"""
-        line_lower = line.strip().lower()
-        
-        section_headers = [
-            'eğitim', 'education', 'deneyim', 'experience', 'yetenekler', 'skills',
-            'projeler', 'projects', 'sertifika', 'certificates', 'referans', 'references',
-            'iletişim', 'contact', 'kişisel', 'personal', 'özet', 'summary',
-            'hobiler', 'hobbies', 'dil', 'languages'
-        ]
-        
-        # Kısa ve bölüm başlığı içeren satırlar
-        return (len(line_lower.split()) <= 3 and 
-                any(header in line_lower for header in section_headers))
-
     def extract_contact_info(self, text: str) -> Dict[str, str]:
         """İletişim bilgilerini çıkarma"""
         contact = {}
@@ -732,7 +751,8 @@ class CVExtractor:
 
         return contact
 
-    def extract_skills(self, text: str) -> List[str]:
+    def extract_skills(self, text: str, lines: Optional[List[str]] = None,
+                       sections: Optional[Dict[str, List[str]]] = None) -> List[str]:
         """Yetenek ve beceri bilgilerini çıkarma"""
         skills = []
         text_lower = text.lower()
@@ -782,46 +802,15 @@ class CVExtractor:
                 skills.append(skill.title())
         
         # Skill bölümlerini dinamik olarak bul
-        skill_sections = self._find_skill_sections(text)
+        if sections is None:
+            sections = self._scan_sections(lines if lines is not None else text.split('\n'))
         
-        for section in skill_sections:
+        for section in sections['skills']:
             section_skills = self._extract_skills_from_section(section)
             skills.extend(section_skills)
         
-        return list(set(skills))
-
-    def _find_skill_sections(self, text: str) -> List[str]:
-        """Skill bölümlerini bulma"""
-        sections = []
-        lines = text.split('\n')
-        
-        for i, line in enumerate(lines):
-            line_lower = line.lower().strip()
-            
-            # Skill başlığı kontrolü
-            if any(keyword in line_lower for keyword in self.skill_keywords):
-                # Bu satırdan sonraki satırları topla
-                section_lines = []
-                for j in range(i + 1, len(lines)):
-                    next_line = lines[j].strip()
-                    if not next_line:
-                        continue
-                    
-                    # Yeni bölüm başladı mı kontrol et
-                    if (any(keyword in next_line.lower() for keyword in self.education_keywords + self.experience_keywords) 
-                        and len(next_line.split()) <= 3):
-                        break
-                    
-                    section_lines.append(next_line)
-                    
-                    # Maksimum 10 satır al
-                    if len(section_lines) >= 10:
-                        break
-                
-                if section_lines:
-                    sections.append(' '.join(section_lines))
-        
-        return sections
+        # Sırayı koruyarak tekrarları temizle
+        return list(dict.fromkeys(skills))
 
     def _extract_skills_from_section(self, section_text: str) -> List[str]:
         """Bir bölümden skill çıkarma"""
@@ -835,8 +824,8 @@ class CVExtractor:
             skill = skill.strip()
             # Uygun uzunlukta ve anlamlı skill'leri al
             if 2 < len(skill) < 50 and not skill.isdigit():
-                # Fazla noktalama işareti içermiyorsa
-                if skill.count('.') < 2 and skill.count('(') < 2:
+                # Fazla noktalama işareti içermiyorsa ('.' ve '(' toplamı en fazla 2)
+                if len(skill) - len(skill.translate(_PUNCT_TABLE)) < 3:
                     skills.append(skill)
         
         return skills
@@ -844,14 +833,18 @@ class CVExtractor:
     def extract_cv_info(self, cv_text: str) -> CVInfo:
         """Ana fonksiyon - CV'den tüm bilgileri çıkarır"""
         try:
-            # Metni temizle
-            cv_text = re.sub(r'\s+', ' ', cv_text)
+            # Satır içi boşlukları sadeleştir, satır yapısını koru
+            lines = [' '.join(line.split()) for line in cv_text.splitlines()]
+            cv_text = '\n'.join(lines)
+            
+            # Bölümler tek geçişte etiketlenir
+            sections = self._scan_sections(lines)
             
             # Tüm bilgileri çıkar
-            names = self.extract_names(cv_text)
-            education = self.extract_education(cv_text)
-            experience = self.extract_experience(cv_text)
-            skills = self.extract_skills(cv_text)
+            names = self.extract_names(cv_text, lines)
+            education = self.extract_education(cv_text, lines, sections)
+            experience = self.extract_experience(cv_text, lines, sections)
+            skills = self.extract_skills(cv_text, lines, sections)
             contact_info = self.extract_contact_info(cv_text)
             
             return CVInfo(
@@ -875,15 +868,27 @@ class CVExtractor:
 class EnhancedCVProcessor:
     """Ana CV işleme sınıfı - tüm işlemleri koordine eder"""
     
-    def __init__(self):
+    def __init__(self, db_manager: Optional[Database] = None, executor: Optional[Executor] = None):
         self.extractor = CVExtractor()
         self.summarizer = CVSummarizer()
-        self.db_manager = Database()
-        
-    def pdf_to_text(self, pdf_content: bytes) -> str:
+        self.db_manager = db_manager or Database()
+        # CPU yoğun analiz bu executor'da çalışır (None: varsayılan thread havuzu)
+        self.executor = executor
+        
+    @staticmethod
+    def _as_stream(content: Union[bytes, BinaryIO]) -> BinaryIO:
+        """Byte içeriği veya dosya nesnesini okunabilir akışa çevir"""
+        return io.BytesIO(content) if isinstance(content, (bytes, bytearray)) else content
+    
+    def pdf_to_text(self, pdf_content: Union[bytes, BinaryIO]) -> str:
         """PDF içeriğini metne çevir (pdfplumber ile)"""
+        global _pdfplumber
         try:
-            with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
+            if _pdfplumber is None:
+                import pdfplumber
+                _pdfplumber = pdfplumber
+            
+            with _pdfplumber.open(self._as_stream(pdf_content)) as pdf:
                 full_text = ""
                 for page in pdf.pages:
                     text = page.extract_text()
@@ -897,11 +902,15 @@ class EnhancedCVProcessor:
         except Exception as e:
             raise Exception(f"PDF okuma hatası: {e}")
     
-    def doc_to_text(self, doc_content: bytes) -> str:
+    def doc_to_text(self, doc_content: Union[bytes, BinaryIO]) -> str:
         """DOC/DOCX içeriğini metne çevir"""
+        global _Document
         try:
-            doc_stream = io.BytesIO(doc_content)
-            doc = Document(doc_stream)
+            if _Document is None:
+                from docx import Document
+                _Document = Document
+            
+            doc = _Document(self._as_stream(doc_content))
             full_text = ""
             
             for para in doc.paragraphs:
@@ -915,7 +924,41 @@ class EnhancedCVProcessor:
         except Exception as e:
             raise Exception(f"DOC okuma hatası: {e}")
     
-    def process_cv_file(self, file_content: bytes, filename: str, content_type: str = None) -> Dict[str, Any]:
+    def _resolve_file_type(self, filename: str, content_type: str = None):
+        """Dosya uzantısından content type ve metne çevirme metodunu belirle"""
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in _EXT_DISPATCH:
+            raise ValueError("Desteklenmeyen dosya formatı. PDF veya DOC/DOCX dosyası gerekli.")
+        default_content_type, to_text_method = _EXT_DISPATCH[ext]
+        return content_type or default_content_type, getattr(self, to_text_method)
+    
+    @staticmethod
+    def _cached_result(existing: Dict, filename: str) -> Dict[str, Any]:
+        """Daha önce işlenmiş CV için kayıtlı sonucu döndür"""
+        return {
+            'file_id': existing.get('file_id'),
+            'metadata_id': existing.get('_id'),
+            'filename': existing.get('filename', filename),
+            'cv_data': existing.get('cv_data', {}),
+            'cached': True,
+            'status': 'success',
+            'message': 'CV daha önce yüklenmiş, kayıtlı sonuç döndürüldü'
+        }
+    
+    @staticmethod
+    def _error_result(e: Exception) -> Dict[str, Any]:
+        print(f"CV işleme hatası: {e}")
+        import traceback
+        traceback.print_exc()
+        return {
+            'status': 'error',
+            'message': f'CV işleme hatası: {str(e)}',
+            'cv_data': None,
+            'file_id': None,
+            'metadata_id': None
+        }
+    
+    async def process_cv_file(self, file_content: bytes, filename: str, content_type: str = None) -> Dict[str, Any]:
         """
         Ana fonksiyon - CV dosyasını işler
         """
@@ -925,64 +968,105 @@ class EnhancedCVProcessor:
             if not file_content or len(file_content) == 0:
                 raise ValueError("Dosya içeriği boş")
             
+            # Aynı dosya daha önce işlendiyse kayıtlı sonucu döndür
+            file_hash = hashlib.blake2b(file_content, digest_size=16).hexdigest()
+            existing = await self.db_manager.find_metadata_by_hash(file_hash)
+            if existing:
+                return self._cached_result(existing, filename)
+            
             # 1. Dosya tipini belirle
-            if content_type is None:
-                if filename.lower().endswith('.pdf'):
-                    content_type = 'application/pdf'
-                elif filename.lower().endswith(('.doc', '.docx')):
-                    content_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                else:
-                    raise ValueError("Desteklenmeyen dosya formatı. PDF veya DOC/DOCX dosyası gerekli.")
+            content_type, to_text = self._resolve_file_type(filename, content_type)
             
             # 2. Dosyayı MongoDB GridFS'e kaydet
-            file_id = self.db_manager.save_cv_file(file_content, filename, content_type)
+            file_id = await self.db_manager.save_cv_file(file_content, filename, content_type)
             
-            # 3. Dosya içeriğini metne çevir
-            if 'pdf' in content_type.lower():
-                cv_text = self.pdf_to_text(file_content)
-            elif 'word' in content_type.lower() or 'document' in content_type.lower():
-                cv_text = self.doc_to_text(file_content)
-            else:
-                raise ValueError("Desteklenmeyen dosya formatı")
-            
-            # 4. CV bilgilerini çıkar
-            cv_info = self.extractor.extract_cv_info(cv_text)
-            
-            # 5. CV özetini oluştur
-            cv_summary = self.summarizer.summarize_cv(cv_text)
-            cv_info.summary = cv_summary
-            
-            # 6. CV metadata'sını MongoDB'ye kaydet
-            metadata_id = self.db_manager.save_cv_metadata(file_id, cv_info, filename)
-            
-            # 7. Sonucu döndür
-            result = {
-                'file_id': str(file_id),
-                'metadata_id': metadata_id,
-                'filename': filename,
-                'content_type': content_type,
-                'cv_data': {
-                    'names': cv_info.names,
-                    'education': cv_info.education,
-                    'experience': cv_info.experience,
-                    'skills': cv_info.skills,
-                    'contact_info': cv_info.contact_info,
-                    'summary': cv_info.summary
-                },
-                'status': 'success',
-                'message': 'CV başarıyla işlendi ve kaydedildi'
-            }
-            
-            return result
+            return await self._process_stored_cv(file_id, file_content, filename, content_type, to_text, file_hash)
             
         except Exception as e:
-            print(f"CV işleme hatası: {e}")
-            import traceback
-            traceback.print_exc()
-            return {
-                'status': 'error',
-                'message': f'CV işleme hatası: {str(e)}',
-                'cv_data': None,
-                'file_id': None,
-                'metadata_id': None
-            }
\ No newline at end of file
+            return self._error_result(e)
+    
+    async def process_cv_upload(self, upload, filename: str, content_type: str = None,
+                                chunk_size: int = 1 << 20) -> Dict[str, Any]:
+        """
+        Yüklenen dosyayı parça parça GridFS'e akıtarak işler; dosyanın
+        tamamı bellekte tek bir bytes nesnesi olarak tutulmaz
+        
+        Args:
+            upload: Asenkron read/seek metotları ve .file nesnesi olan yükleme (UploadFile)
+        """
+        grid_in = None
+        try:
+            # 1. Dosya tipini belirle
+            content_type, to_text = self._resolve_file_type(filename, content_type)
+            
+            # 2. Dosyayı GridFS'e akıtırken hash'ini hesapla
+            hasher = hashlib.blake2b(digest_size=16)
+            grid_in = self.db_manager.open_cv_upload_stream(filename, content_type)
+            size = 0
+            while chunk := await upload.read(chunk_size):
+                hasher.update(chunk)
+                size += len(chunk)
+                await grid_in.write(chunk)
+            
+            if size == 0:
+                raise ValueError("Dosya içeriği boş")
+            
+            # Aynı dosya daha önce işlendiyse yeni kaydı iptal et
+            file_hash = hasher.hexdigest()
+            existing = await self.db_manager.find_metadata_by_hash(file_hash)
+            if existing:
+                await grid_in.abort()
+                return self._cached_result(existing, filename)
+            
+            await grid_in.close()
+            file_id = grid_in._id
+            grid_in = None
+            
+            # 3+. Metin çıkarma, yerel (spool) dosya üzerinden yapılır
+            await upload.seek(0)
+            return await self._process_stored_cv(file_id, upload.file, filename, content_type, to_text, file_hash)
+            
+        except Exception as e:
+            if grid_in is not None and not grid_in.closed:
+                await grid_in.abort()
+            return self._error_result(e)
+    
+    def _analyze_cv(self, source, to_text) -> CVInfo:
+        """Dosyayı metne çevirir, bilgileri çıkarır ve özetler (senkron, CPU yoğun)"""
+        # 3. Dosya içeriğini metne çevir
+        cv_text = to_text(source)
+        
+        # 4. CV bilgilerini çıkar
+        cv_info = self.extractor.extract_cv_info(cv_text)
+        
+        # 5. CV özetini oluştur
+        cv_info.summary = self.summarizer.summarize_cv(cv_text)
+        return cv_info
+    
+    async def _process_stored_cv(self, file_id, source, filename: str, content_type: str,
+                                 to_text, file_hash: str) -> Dict[str, Any]:
+        """GridFS'e kaydedilmiş CV'yi metne çevirir, analiz eder ve metadata'sını kaydeder"""
+        # 3-5. Metin çıkarma, analiz ve özetleme event loop'u bloklamadan çalışır
+        loop = asyncio.get_running_loop()
+        cv_info = await loop.run_in_executor(self.executor, self._analyze_cv, source, to_text)
+        
+        # 6. CV metadata'sını MongoDB'ye kaydet
+        metadata_id = await self.db_manager.save_cv_metadata(file_id, cv_info, filename, file_hash)
+        
+        # 7. Sonucu döndür
+        return {
+            'file_id': str(file_id),
+            'metadata_id': metadata_id,
+            'filename': filename,
+            'content_type': content_type,
+            'cv_data': {
+                'names': cv_info.names,
+                'education': cv_info.education,
+                'experience': cv_info.experience,
+                'skills': cv_info.skills,
+                'contact_info': cv_info.contact_info,
+                'summary': cv_info.summary
+            },
+            'status': 'success',
+            'message': 'CV başarıyla işlendi ve kaydedildi'
+        }
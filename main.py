@@ -1,38 +1,174 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional, Dict, Any
 import uvicorn
 import os
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import orjson
+from bson import ObjectId
 
 from cv_parse import EnhancedCVProcessor
 from mongodb import Database, fix_mongo_ids
 from notify import NotificationService
 from vector import VectorMatcher
 
+def _orjson_default(obj):
+    """orjson'un doğrudan desteklemediği tipleri serileştir"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"{type(obj).__name__} JSON'a çevrilemiyor")
+
+# Mongo'nun naive UTC tarihleri +00:00 ile, eşleştiricinin numpy skorları doğrudan yazılır
+_ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+
+class MongoORJSONResponse(ORJSONResponse):
+    """ObjectId alanlarını da serileştirebilen orjson yanıt sınıfı"""
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=_ORJSON_OPTIONS)
+
+# Servisleri başlat
+db = Database()
+vector_matcher = VectorMatcher()
+notification_service = NotificationService()
+
+# Model çıkarımı ve FAISS araması için havuz (torch/numpy/faiss GIL'i bırakır)
+cpu_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+async def run_cpu(func, *args):
+    """CPU yoğun senkron işi event loop'u bloklamadan havuzda çalıştır"""
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, func, *args)
+
+# CV işleyici tek sefer kurulur; dosyaya özgü durum sadece metot argümanlarında tutulur
+cv_processor = EnhancedCVProcessor(db, cpu_executor)
+
+# Yeni yüklenen CV'lerin indekse eklenmek üzere beklediği kuyruk
+index_queue: asyncio.Queue = asyncio.Queue()
+
+# Sorgu projeksiyonları: sadece kullanılan alanlar okunur ve decode edilir
+INDEX_FIELDS = {
+    "cv_data.summary": 1,
+    "cv_data.names": 1,
+    "cv_data.skills": 1,
+    "cv_data.experience.position": 1,
+    "cv_data.experience.company": 1,
+    "cv_data.education.institution": 1,
+    "cv_data.education.degree_type": 1
+}
+CONTACT_FIELDS = {"cv_data.contact_info.email": 1, "cv_data.names": 1}
+JOB_MATCH_FIELDS = {"title": 1, "company": 1, "description": 1, "requirements": 1, "matching_parameters": 1}
+
+def validate_object_id(value: str, label: str) -> str:
+    """ID'nin geçerli bir ObjectId olduğunu DB'ye gitmeden kontrol et"""
+    if not ObjectId.is_valid(value):
+        raise HTTPException(status_code=400, detail=f"Geçersiz {label} ID: {value}")
+    return value
+
+def prepare_candidate(candidate: Dict) -> Dict:
+    """Adayın eşleştirmede kullanılacak summary alanını hazırla"""
+    cv_data = candidate.get("cv_data", {})
+    summary = cv_data.get("summary", "")
+    
+    # Eğer summary yoksa, diğer alanlardan oluştur
+    if not summary:
+        skills = cv_data.get("skills", [])
+        experience = cv_data.get("experience", [])
+        education = cv_data.get("education", [])
+        
+        summary_parts = []
+        if skills:
+            summary_parts.append(f"Beceriler: {', '.join(skills[:5])}")
+        if experience:
+            exp_titles = [exp.get("position", "") for exp in experience if exp.get("position")]
+            if exp_titles:
+                summary_parts.append(f"Deneyim: {', '.join(exp_titles[:3])}")
+        if education:
+            edu_info = [edu.get("institution", "") for edu in education if edu.get("institution")]
+            if edu_info:
+                summary_parts.append(f"Eğitim: {', '.join(edu_info[:2])}")
+        
+        summary = "; ".join(summary_parts) if summary_parts else "Detay bilgi bulunamadı"
+    
+    candidate["summary"] = summary
+    return candidate
+
+async def build_vector_index():
+    """Kayıtlı tüm adaylardan vektör indeksini bir kez oluştur"""
+    candidates = await db.get_candidate_summaries(INDEX_FIELDS)
+    if candidates is None:
+        # Aggregation başarısızsa summary'leri Python'da hazırla
+        candidates = [prepare_candidate(c) for c in await db.get_all_candidates(INDEX_FIELDS)]
+    if candidates:
+        await vector_matcher.create_index_cached(candidates, db)
+
+async def index_worker():
+    """Kuyruktaki yeni adayları tek tek indekse ekle (tam yeniden oluşturma yok)"""
+    while True:
+        candidate = await index_queue.get()
+        try:
+            candidate_id = str(candidate["_id"])
+            # Kuyrukta beklerken silinen aday indekse eklenmez
+            if not await db.get_cv(candidate_id, {"_id": 1}):
+                continue
+            await run_cpu(vector_matcher.add_candidate, prepare_candidate(candidate))
+            # Ekleme sürerken silindiyse delete_candidate'in remove_candidate'i adayı bulamamış olabilir
+            if not await db.get_cv(candidate_id, {"_id": 1}):
+                await run_cpu(vector_matcher.remove_candidate, candidate_id)
+        except Exception as e:
+            print(f"İndeks güncelleme hatası: {e}")
+        finally:
+            index_queue.task_done()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await db.ensure_indexes()
+        await build_vector_index()
+    except Exception as e:
+        print(f"Vektör indeksi oluşturulamadı: {e}")
+    
+    worker = asyncio.create_task(index_worker())
+    yield
+    worker.cancel()
+    cpu_executor.shutdown(wait=False)
+
 app = FastAPI(
     title="TalentMatch NLP",
     description="CV Analizi ve İş Eşleştirme Uygulaması",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=MongoORJSONResponse
 )
 
 # CORS middleware yapılandırması
+# Not: Ek middleware gerekirse @app.middleware("http") (BaseHTTPMiddleware) yerine
+# saf ASGI sınıfı olarak yazılmalı: __init__(self, app) + async __call__(self, scope, receive, send)
+cors_origins = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:8501,http://127.0.0.1:8501").split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# Servisleri başlat
-db = Database()
-vector_matcher = VectorMatcher()
-notification_service = NotificationService()
-
 # Pydantic Modeller
-class JobPosting(BaseModel):
+class FrozenModel(BaseModel):
+    """İstek gövdeleri için ortak ayarlar: bilinmeyen alanlar atılır, model değiştirilemez"""
+    class Config:
+        extra = "ignore"
+        frozen = True
+
+class JobPosting(FrozenModel):
     title: str 
     description: str 
     requirements: List[str] 
@@ -40,15 +176,15 @@ class JobPosting(BaseModel):
     company: str 
     matching_parameters: Optional[Dict[str, Any]] = None  
 
-class MatchParameters(BaseModel):
+class MatchParameters(FrozenModel):
     min_match_percentage: float = 70.0  
     required_skills: List[str] = []  
     preferred_skills: List[str] = [] 
 
-class NotificationRequest(BaseModel):
+class NotificationRequest(FrozenModel):
     match_ids: List[str]  # Gönderilecek eşleşme ID'leri
 
-class BulkNotificationRequest(BaseModel):
+class BulkNotificationRequest(FrozenModel):
     job_id: str
     candidate_ids: Optional[List[str]] = None  # Belirli adaylar (boşsa hepsi)
 
@@ -92,19 +228,22 @@ async def upload_cv(file: UploadFile = File(...)):
         )
 
     try:
-        # Dosya içeriğini oku
-        file_content = await file.read()
-        
-        if not file_content:
+        if file.size == 0:
             raise HTTPException(status_code=400, detail="Dosya içeriği boş")
         
-        # CV'yi işle
-        processor = EnhancedCVProcessor()
-        result = processor.process_cv_file(file_content, file.filename)
+        # CV'yi işle (dosya GridFS'e parça parça akıtılır)
+        result = await cv_processor.process_cv_upload(file, file.filename)
         
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
         
+        # Yeni adayı arka planda vektör indeksine ekle
+        if not result.get("cached"):
+            await index_queue.put({
+                "_id": result.get("metadata_id"),
+                "cv_data": result.get("cv_data", {})
+            })
+        
         return {
             "message": result["message"],
             "status": result["status"],
@@ -125,7 +264,7 @@ async def upload_cv(file: UploadFile = File(...)):
 async def get_all_candidates():
     """Tüm adayları listele"""
     try:
-        candidates = db.get_all_candidates()
+        candidates = await db.get_all_candidates()
         return {
             "candidates": candidates,
             "count": len(candidates)
@@ -136,8 +275,10 @@ async def get_all_candidates():
 @app.get("/candidates/{candidate_id}")
 async def get_candidate(candidate_id: str):
     """Belirli bir adayın detaylarını al"""
+    validate_object_id(candidate_id, "aday")
+    
     try:
-        candidate = db.get_cv(candidate_id)
+        candidate = await db.get_cv(candidate_id)
         if not candidate:
             raise HTTPException(status_code=404, detail="Aday bulunamadı")
         return candidate
@@ -158,11 +299,13 @@ async def create_job_posting(job: JobPosting):
         if not job.requirements:
             raise HTTPException(status_code=400, detail="En az bir gereksinim belirtilmelidir")
         
-        job_id = db.store_job_posting(job.dict())
+        job_data = job.dict()
+        # store_job_posting kaydı yerinde zenginleştirir; yanıt istek verisini döndürür
+        job_id = await db.store_job_posting({**job_data})
         return {
             "message": "İş ilanı başarıyla oluşturuldu",
             "job_id": job_id,
-            "job_data": job.dict()
+            "job_data": job_data
         }
     except HTTPException:
         raise
@@ -173,7 +316,7 @@ async def create_job_posting(job: JobPosting):
 async def get_all_job_postings():
     """Tüm iş ilanlarını listele"""
     try:
-        jobs = db.get_all_job_postings()
+        jobs = await db.get_all_job_postings()
         return {
             "job_postings": jobs,
             "count": len(jobs)
@@ -184,8 +327,10 @@ async def get_all_job_postings():
 @app.get("/job-postings/{job_id}")
 async def get_job_posting(job_id: str):
     """Belirli bir iş ilanının detaylarını al"""
+    validate_object_id(job_id, "iş ilanı")
+    
     try:
-        job = db.get_job_posting(job_id)
+        job = await db.get_job_posting(job_id)
         if not job:
             raise HTTPException(status_code=404, detail="İş ilanı bulunamadı")
         return job
@@ -197,71 +342,54 @@ async def get_job_posting(job_id: str):
 @app.post("/match-candidates/{job_id}")
 async def match_candidates(job_id: str):
     """Bir iş ilanı için uygun adayları bulma"""
+    validate_object_id(job_id, "iş ilanı")
+    
     try:
         # İş ilanını al
-        job = db.get_job_posting(job_id)
+        job = await db.get_job_posting(job_id, JOB_MATCH_FIELDS)
         if not job:
             raise HTTPException(status_code=404, detail="İş ilanı bulunamadı")
         
-        # Tüm adayları al
-        candidates = db.get_all_candidates()
-        if not candidates:
+        # İndeks başlangıçta oluşturulur ve yeni CV'lerle artımlı güncellenir
+        if vector_matcher.index is None or vector_matcher.index.ntotal == 0:
             return {
                 "message": "Henüz hiç aday kaydedilmemiş",
                 "matches": [],
                 "count": 0
             }
         
-        # Adayların summary'sini hazırla
-        for candidate in candidates:
-            cv_data = candidate.get("cv_data", {})
-            summary = cv_data.get("summary", "")
-            
-            # Eğer summary yoksa, diğer alanlardan oluştur
-            if not summary:
-                skills = cv_data.get("skills", [])
-                experience = cv_data.get("experience", [])
-                education = cv_data.get("education", [])
-                
-                summary_parts = []
-                if skills:
-                    summary_parts.append(f"Beceriler: {', '.join(skills[:5])}")
-                if experience:
-                    exp_titles = [exp.get("position", "") for exp in experience if exp.get("position")]
-                    if exp_titles:
-                        summary_parts.append(f"Deneyim: {', '.join(exp_titles[:3])}")
-                if education:
-                    edu_info = [edu.get("institution", "") for edu in education if edu.get("institution")]
-                    if edu_info:
-                        summary_parts.append(f"Eğitim: {', '.join(edu_info[:2])}")
-                
-                summary = "; ".join(summary_parts) if summary_parts else "Detay bilgi bulunamadı"
-            
-            candidate["summary"] = summary
-        
-        # Vektör indeksini oluştur
-        vector_matcher.create_index(candidates)
+        # Zorunlu beceriler varsa adayları önce MongoDB'de filtrele
+        candidate_ids = None
+        required_skills = (job.get("matching_parameters") or {}).get("required_skills")
+        if required_skills:
+            candidate_ids = await db.get_candidates_matching_skills(required_skills)
+            if not candidate_ids:
+                return {
+                    "message": "Zorunlu becerilerin hepsine sahip aday bulunamadı",
+                    "matches": [],
+                    "count": 0
+                }
         
         # İş ilanı metnini hazırla
         job_text = f"{job['title']} {job['description']} {' '.join(job['requirements'])}"
         
+        # Sorgu embedding'i önbellekte yoksa MongoDB'den ya da modelden hazırla
+        await vector_matcher.prefetch_query_embeddings([job_text], db, cpu_executor)
+        
         # Eşleşmeleri bul
-        matches = vector_matcher.find_matches(job_text, k=min(10, len(candidates)))
+        matches = await run_cpu(
+            vector_matcher.find_matches, job_text, min(10, vector_matcher.index.ntotal), 0.0, candidate_ids
+        )
         
-        # Her eşleşmeyi veritabanına kaydet
-        saved_matches = []
-        for match in matches:
-            try:
-                match_id = db.store_match(job_id, match["candidate_id"], match)
-                match["match_id"] = match_id
-                saved_matches.append(match)
-            except Exception as e:
-                print(f"Eşleşme kayıt hatası: {e}")
+        # Eşleşmeleri tek istekte veritabanına kaydet
+        match_ids = await db.store_matches_bulk(job_id, matches)
+        for match, match_id in zip(matches, match_ids):
+            match["match_id"] = match_id
         
         return {
-            "message": f"{len(saved_matches)} aday eşleşmesi bulundu",
-            "matches": saved_matches,
-            "count": len(saved_matches),
+            "message": f"{len(matches)} aday eşleşmesi bulundu",
+            "matches": matches,
+            "count": len(matches),
             "job_info": {
                 "title": job["title"],
                 "company": job["company"]
@@ -279,8 +407,10 @@ async def match_candidates(job_id: str):
 @app.get("/job-postings/{job_id}/matches")
 async def get_job_matches(job_id: str):
     """Bir iş ilanı için tüm eşleşmeleri alma"""
+    validate_object_id(job_id, "iş ilanı")
+    
     try:
-        matches = db.get_matches_for_job(job_id)
+        matches = await db.get_matches_for_job(job_id)
         return {
             "matches": matches,
             "count": len(matches)
@@ -291,8 +421,10 @@ async def get_job_matches(job_id: str):
 @app.put("/job-postings/{job_id}/parameters")
 async def update_match_parameters(job_id: str, parameters: MatchParameters):
     """İş ilanı için eşleştirme parametrelerini güncelleme"""
+    validate_object_id(job_id, "iş ilanı")
+    
     try:
-        success = db.update_match_parameters(job_id, parameters.dict())
+        success = await db.update_match_parameters(job_id, parameters.dict())
         if not success:
             raise HTTPException(status_code=404, detail="İş ilanı bulunamadı")
         
@@ -308,26 +440,32 @@ async def send_notifications_manual(request: BulkNotificationRequest):
     Belirli bir iş ilanı için eşleşen adaylara manuel olarak bildirim gönder
     Admin panelinden çağrılacak
     """
+    validate_object_id(request.job_id, "iş ilanı")
+    candidate_ids = {validate_object_id(c, "aday") for c in request.candidate_ids or []}
+    
     try:
         # İş ilanını kontrol et
-        job = db.get_job_posting(request.job_id)
+        job = await db.get_job_posting(request.job_id)
         if not job:
             raise HTTPException(status_code=404, detail="İş ilanı bulunamadı")
         
         # Eşleşmeleri al
-        matches = db.get_matches_for_job(request.job_id)
+        matches = await db.get_matches_for_job(request.job_id)
         if not matches:
             raise HTTPException(status_code=404, detail="Bu iş ilanı için eşleşme bulunamadı")
         
         # Belirli adaylar seçildiyse filtrele
-        if request.candidate_ids:
-            matches = [m for m in matches if m["candidate_id"] in request.candidate_ids]
+        if candidate_ids:
+            matches = [m for m in matches if m["candidate_id"] in candidate_ids]
+        
+        # Aday bilgilerini tek sorguda al
+        candidates = await db.get_cvs_by_ids((m["candidate_id"] for m in matches), CONTACT_FIELDS)
+        candidates_by_id = {c["_id"]: c for c in candidates}
         
         # Bildirim gönderilecek eşleşmeleri hazırla
         notifications_to_send = []
         for match in matches:
-            # Aday bilgilerini al
-            candidate = db.get_cv(match["candidate_id"])
+            candidate = candidates_by_id.get(match["candidate_id"])
             if not candidate:
                 continue
                 
@@ -359,12 +497,10 @@ async def send_notifications_manual(request: BulkNotificationRequest):
             )
         
         # Bildirimleri gönder
-        results = notification_service.send_bulk_notifications(notifications_to_send)
+        results = await notification_service.send_bulk_notifications(notifications_to_send, render_cache=db)
         
-        # Başarıyla gönderilen bildirimleri işaretle
-        for notification in notifications_to_send:
-            if notification.get('match_id'):
-                db.mark_notification_sent(notification['match_id'])
+        # Yalnızca başarıyla gönderilen bildirimleri tek sorguda işaretle
+        await db.bulk_mark_notifications_sent(results.pop('sent_match_ids'))
         
         return {
             "message": "Bildirimler gönderildi",
@@ -383,26 +519,8 @@ async def send_notifications_manual(request: BulkNotificationRequest):
 async def get_unsent_notifications():
     """Henüz gönderilmemiş bildirimleri listele"""
     try:
-        unsent_matches = db.get_unsent_matches()
-        
-        # Her eşleşme için iş ilanı ve aday bilgilerini ekle
-        detailed_matches = []
-        for match in unsent_matches:
-            job = db.get_job_posting(match["job_id"])
-            candidate = db.get_cv(match["candidate_id"])
-            
-            if job and candidate:
-                candidate_email = candidate.get("cv_data", {}).get("contact_info", {}).get("email")
-                match_detail = {
-                    "match_id": match["_id"],
-                    "job_title": job["title"],
-                    "company": job["company"],
-                    "candidate_name": candidate.get("cv_data", {}).get("names", ["Bilinmiyor"])[0] if candidate.get("cv_data", {}).get("names") else "Bilinmiyor",
-                    "candidate_email": candidate_email,
-                    "match_percentage": match["match_percentage"],
-                    "created_at": match["created_at"]
-                }
-                detailed_matches.append(match_detail)
+        # Eşleşme, iş ilanı ve aday bilgileri tek aggregation ile birleştirilir
+        detailed_matches = await db.get_unsent_notifications_detailed()
         
         return {
             "unsent_notifications": detailed_matches,
@@ -415,25 +533,24 @@ async def get_unsent_notifications():
 @app.delete("/candidates/{candidate_id}")
 async def delete_candidate(candidate_id: str):
     """Aday kaydını sil"""
+    validate_object_id(candidate_id, "aday")
+    
     try:
-        candidate = db.get_cv(candidate_id)
+        candidate = await db.get_cv(candidate_id, {"file_id": 1})
         if not candidate:
             raise HTTPException(status_code=404, detail="Aday bulunamadı")
         
         # GridFS'den dosyayı sil
         if candidate.get("file_id"):
-            try:
-                db.fs.delete(candidate["file_id"])
-            except Exception as e:
-                print(f"Dosya silme hatası: {e}")
+            await db.delete_cv_file(candidate["file_id"])
         
         # Metadata'yı sil
-        from bson import ObjectId
-        result = db.cv_metadata.delete_one({"_id": ObjectId(candidate_id)})
-        
-        if result.deleted_count == 0:
+        if not await db.delete_cv(candidate_id):
             raise HTTPException(status_code=404, detail="Aday silinirken hata oluştu")
         
+        # Adayı vektör indeksinden çıkar
+        await run_cpu(vector_matcher.remove_candidate, candidate_id)
+        
         return {"message": "Aday başarıyla silindi"}
         
     except HTTPException:
@@ -444,21 +561,16 @@ async def delete_candidate(candidate_id: str):
 @app.delete("/job-postings/{job_id}")
 async def delete_job_posting(job_id: str):
     """İş ilanını sil"""
+    validate_object_id(job_id, "iş ilanı")
+    
     try:
-        from bson import ObjectId
-        
         # İş ilanının varlığını kontrol et
-        job = db.get_job_posting(job_id)
+        job = await db.get_job_posting(job_id, {"_id": 1})
         if not job:
             raise HTTPException(status_code=404, detail="İş ilanı bulunamadı")
         
-        # İlişkili eşleşmeleri sil
-        db.matches.delete_many({"job_id": job_id})
-        
-        # İş ilanını sil
-        result = db.job_postings.delete_one({"_id": ObjectId(job_id)})
-        
-        if result.deleted_count == 0:
+        # İş ilanını ve ilişkili eşleşmeleri sil
+        if not await db.delete_job_posting(job_id):
             raise HTTPException(status_code=404, detail="İş ilanı silinirken hata oluştu")
         
         return {"message": "İş ilanı ve ilişkili eşleşmeler başarıyla silindi"}
@@ -472,10 +584,12 @@ async def delete_job_posting(job_id: str):
 async def get_statistics():
     """Sistem istatistiklerini al"""
     try:
-        candidates_count = len(db.get_all_candidates())
-        jobs_count = len(db.get_all_job_postings())
-        matches_count = db.matches.count_documents({})
-        unsent_notifications_count = len(db.get_unsent_matches())
+        candidates_count, jobs_count, matches_count, unsent_notifications_count = await asyncio.gather(
+            db.count_candidates(),
+            db.count_job_postings(),
+            db.count_matches(),
+            db.count_unsent_matches()
+        )
         
         return {
             "candidates": candidates_count,
@@ -1,57 +1,161 @@
-from pymongo import MongoClient
-from gridfs import GridFS
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 from typing import Dict, List, Optional
 import json
 from datetime import datetime
+from functools import lru_cache
 import os
 from dotenv import load_dotenv
-from bson import ObjectId
+from bson import ObjectId, Binary
+from pymongo.errors import BulkWriteError
 
 load_dotenv()
 
 def fix_mongo_ids(doc):
-    """MongoDB ObjectId'lerini string'e çevir"""
-    if isinstance(doc, list):
-        return [fix_mongo_ids(d) for d in doc]
-    if isinstance(doc, dict):
-        new_doc = {}
-        for k, v in doc.items():
+    """MongoDB ObjectId'lerini string'e çevir (yerinde, özyineleme olmadan)"""
+    if isinstance(doc, ObjectId):
+        return str(doc)
+    if not isinstance(doc, (dict, list)):
+        return doc
+    
+    stack = [doc]
+    while stack:
+        container = stack.pop()
+        items = container.items() if isinstance(container, dict) else enumerate(container)
+        for k, v in items:
             if isinstance(v, ObjectId):
-                new_doc[k] = str(v)
-            elif isinstance(v, dict) or isinstance(v, list):
-                new_doc[k] = fix_mongo_ids(v)
-            else:
-                new_doc[k] = v
-        return new_doc
+                container[k] = str(v)
+            elif isinstance(v, (dict, list)):
+                stack.append(v)
     return doc
 
+@lru_cache(maxsize=4096)
+def _oid(value) -> ObjectId:
+    """String ID'yi ObjectId'ye çevir (tekrarlanan ID'ler önbellekten gelir)"""
+    return value if isinstance(value, ObjectId) else ObjectId(value)
+
+def _join_expr(array_expr, separator: str) -> Dict:
+    """Aggregation içinde string dizisini ayraçla birleştir (Python'daki str.join)"""
+    return {"$reduce": {
+        "input": array_expr,
+        "initialValue": "",
+        "in": {"$concat": [
+            "$$value",
+            {"$cond": [{"$eq": ["$$value", ""]}, "", separator]},
+            "$$this"
+        ]}
+    }}
+
+def _nonempty_slice(field: str, n: int) -> Dict:
+    """Dizideki boş olmayan ilk n değeri al"""
+    return {"$slice": [
+        {"$filter": {"input": {"$ifNull": [field, []]}, "cond": {"$gt": ["$$this", ""]}}},
+        n
+    ]}
+
+def _labeled_part(label: str, array_expr) -> Dict:
+    """Dizi boş değilse 'Etiket: a, b' parçası, boşsa null"""
+    return {"$cond": [
+        {"$gt": [{"$size": array_expr}, 0]},
+        {"$concat": [label, _join_expr(array_expr, ", ")]},
+        None
+    ]}
+
+# summary boşsa beceri/deneyim/eğitimden özet metni sunucu tarafında oluşturur
+_SUMMARY_EXPR = {"$let": {
+    "vars": {"parts": {"$filter": {
+        "input": [
+            _labeled_part("Beceriler: ", _nonempty_slice("$cv_data.skills", 5)),
+            _labeled_part("Deneyim: ", _nonempty_slice("$cv_data.experience.position", 3)),
+            _labeled_part("Eğitim: ", _nonempty_slice("$cv_data.education.institution", 2)),
+        ],
+        "cond": {"$ne": ["$$this", None]}
+    }}},
+    "in": {"$cond": [
+        {"$gt": [{"$strLenCP": {"$ifNull": ["$cv_data.summary", ""]}}, 0]},
+        "$cv_data.summary",
+        {"$cond": [
+            {"$gt": [{"$size": "$$parts"}, 0]},
+            _join_expr("$$parts", "; "),
+            "Detay bilgi bulunamadı"
+        ]}
+    ]}
+}}
+
+# Beceri karşılaştırmaları büyük/küçük harf duyarsız (Türkçe İ/ı kurallarıyla)
+_SKILL_COLLATION = {"locale": "tr", "strength": 2}
+
+@lru_cache(maxsize=None)
+def _get_client() -> AsyncIOMotorClient:
+    """Süreç genelinde tek MongoDB istemcisi (tüm Database örnekleri aynı havuzu paylaşır)"""
+    # Bağlantı havuzu ve wire protocol sıkıştırması; zstd/snappy sunucuda ve
+    # istemcide (zstandard / python-snappy) yoksa pymongo zlib'e düşer
+    return AsyncIOMotorClient(
+        os.getenv("MONGODB_URI", "mongodb://localhost:27017/"),
+        maxPoolSize=int(os.getenv("MONGODB_MAX_POOL_SIZE", "200")),
+        minPoolSize=int(os.getenv("MONGODB_MIN_POOL_SIZE", "10")),
+        serverSelectionTimeoutMS=int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "3000")),
+        compressors=os.getenv("MONGODB_COMPRESSORS", "zstd,snappy,zlib"),
+        retryWrites=True,
+        w="majority"
+    )
+
 class Database:
     def __init__(self):
         """MongoDB bağlantısını ve GridFS'i başlat"""
-        self.client = MongoClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017/"))
+        self.client = _get_client()
         self.db = self.client.talentmatch
-        self.fs = GridFS(self.db)
+        self.fs = AsyncIOMotorGridFSBucket(self.db)
         
         # Koleksiyonlar
         self.cv_metadata = self.db.cv_metadata  # Tek koleksiyon kullan
         self.job_postings = self.db.job_postings
         self.matches = self.db.matches
+        self.embedding_cache = self.db.embedding_cache
+        self.rendered_emails = self.db.rendered_emails
+    
+    async def ensure_indexes(self):
+        """Gerekli indeksleri oluştur (uygulama açılışında bir kez çağrılır)"""
+        # Aynı dosyanın tekrar yüklenmesini hızlıca tespit etmek için
+        await self.cv_metadata.create_index("file_hash", background=True)
+        await self.cv_metadata.create_index([("file_id", 1)], background=True)
+        
+        # required_skills ön filtresi: aynı collation ile multikey indeks
+        await self.cv_metadata.create_index(
+            [("cv_data.skills", 1)], collation=_SKILL_COLLATION, background=True
+        )
+        
+        # get_matches_for_job: job_id filtresi + match_percentage sıralaması indeksten okunur
+        await self.matches.create_index([("job_id", 1), ("match_percentage", -1)], background=True)
+        await self.matches.create_index([("notification_sent", 1)], background=True)
+        
+        # get_all_job_postings: created_at'e göre sıralama
+        await self.job_postings.create_index([("created_at", -1)], background=True)
         
-    def save_cv_file(self, file_content: bytes, filename: str, content_type: str):
+        # Render edilmiş e-postalar bir gün sonra otomatik silinir
+        await self.rendered_emails.create_index("ts", expireAfterSeconds=86400, background=True)
+        
+    async def save_cv_file(self, file_content: bytes, filename: str, content_type: str):
         """Dosyayı GridFS'e kaydeder ve file_id döner"""
-        file_id = self.fs.put(
-            file_content, 
-            filename=filename, 
-            content_type=content_type,
-            upload_date=datetime.utcnow()
+        file_id = await self.fs.upload_from_stream(
+            filename,
+            file_content,
+            metadata={"content_type": content_type, "upload_date": datetime.utcnow()}
         )
         return file_id
 
-    def save_cv_metadata(self, file_id, cv_info, filename: str):
+    def open_cv_upload_stream(self, filename: str, content_type: str):
+        """Dosyayı parça parça yazmak için GridFS yükleme akışı aç"""
+        return self.fs.open_upload_stream(
+            filename,
+            metadata={"content_type": content_type, "upload_date": datetime.utcnow()}
+        )
+
+    async def save_cv_metadata(self, file_id, cv_info, filename: str, file_hash: Optional[str] = None):
         """CV bilgilerini metadata koleksiyonuna kaydeder"""
         metadata = {
             "file_id": file_id,
             "filename": filename,
+            "file_hash": file_hash,
             "upload_date": datetime.utcnow(),
             "cv_data": {
                 "names": cv_info.names,
@@ -62,46 +166,95 @@ class Database:
                 "summary": cv_info.summary
             }
         }
-        result = self.cv_metadata.insert_one(metadata)
+        result = await self.cv_metadata.insert_one(metadata)
         return str(result.inserted_id)
     
-    def get_cv(self, cv_id: str) -> Optional[Dict]:
-        """CV meta verilerini al"""
+    async def get_cv(self, cv_id: str, fields: Optional[Dict] = None) -> Optional[Dict]:
+        """CV meta verilerini al (fields: sadece istenen alanlar için projection)"""
         try:
-            cv_data = self.cv_metadata.find_one({"_id": ObjectId(cv_id)})
+            cv_data = await self.cv_metadata.find_one({"_id": _oid(cv_id)}, projection=fields)
             return fix_mongo_ids(cv_data) if cv_data else None
         except Exception as e:
             print(f"CV getirme hatası: {e}")
             return None
     
-    def get_cv_file(self, file_id) -> Optional[bytes]:
+    async def get_cvs_by_ids(self, cv_ids, fields: Optional[Dict] = None) -> List[Dict]:
+        """Birden fazla CV'yi tek sorguda al"""
+        try:
+            oids = [_oid(i) for i in set(cv_ids) if ObjectId.is_valid(i)]
+            cvs = await self.cv_metadata.find({"_id": {"$in": oids}}, projection=fields).to_list(length=None)
+            return fix_mongo_ids(cvs)
+        except Exception as e:
+            print(f"CV'leri getirme hatası: {e}")
+            return []
+    
+    async def find_metadata_by_hash(self, file_hash: str) -> Optional[Dict]:
+        """Dosya içerik hash'ine göre daha önce işlenmiş CV'yi bul"""
+        try:
+            cv_data = await self.cv_metadata.find_one({"file_hash": file_hash})
+            return fix_mongo_ids(cv_data) if cv_data else None
+        except Exception as e:
+            print(f"CV hash arama hatası: {e}")
+            return None
+    
+    async def get_cv_file(self, file_id) -> Optional[bytes]:
         """GridFS'den dosya içeriğini al"""
         try:
-            if isinstance(file_id, str):
-                file_id = ObjectId(file_id)
-            file_data = self.fs.get(file_id)
-            return file_data.read()
+            file_id = _oid(file_id)
+            grid_out = await self.fs.open_download_stream(file_id)
+            return await grid_out.read()
         except Exception as e:
             print(f"Dosya getirme hatası: {e}")
             return None
     
-    def store_job_posting(self, job_data: Dict) -> str:
+    async def delete_cv_file(self, file_id) -> bool:
+        """GridFS'deki CV dosyasını sil"""
+        try:
+            file_id = _oid(file_id)
+            await self.fs.delete(file_id)
+            return True
+        except Exception as e:
+            print(f"Dosya silme hatası: {e}")
+            return False
+    
+    async def delete_cv(self, cv_id: str) -> bool:
+        """CV meta verilerini sil"""
+        result = await self.cv_metadata.delete_one({"_id": _oid(cv_id)})
+        return result.deleted_count > 0
+    
+    async def store_job_posting(self, job_data: Dict) -> str:
         """İş ilanını veritabanına kaydet"""
         job_data["created_at"] = datetime.utcnow()
         job_data["status"] = "active"
-        result = self.job_postings.insert_one(job_data)
+        result = await self.job_postings.insert_one(job_data)
         return str(result.inserted_id)
     
-    def get_job_posting(self, job_id: str) -> Optional[Dict]:
-        """İş ilanını veritabanından al"""
+    async def get_job_posting(self, job_id: str, fields: Optional[Dict] = None) -> Optional[Dict]:
+        """İş ilanını veritabanından al (fields: sadece istenen alanlar için projection)"""
         try:
-            doc = self.job_postings.find_one({"_id": ObjectId(job_id)})
+            doc = await self.job_postings.find_one({"_id": _oid(job_id)}, projection=fields)
             return fix_mongo_ids(doc) if doc else None
         except Exception as e:
             print(f"İş ilanı getirme hatası: {e}")
             return None
     
-    def store_match(self, job_id: str, candidate_id: str, match_data: Dict) -> str:
+    async def get_jobs_by_ids(self, job_ids, fields: Optional[Dict] = None) -> List[Dict]:
+        """Birden fazla iş ilanını tek sorguda al"""
+        try:
+            oids = [_oid(i) for i in set(job_ids) if ObjectId.is_valid(i)]
+            jobs = await self.job_postings.find({"_id": {"$in": oids}}, projection=fields).to_list(length=None)
+            return fix_mongo_ids(jobs)
+        except Exception as e:
+            print(f"İş ilanlarını getirme hatası: {e}")
+            return []
+    
+    async def delete_job_posting(self, job_id: str) -> bool:
+        """İş ilanını ve ilişkili eşleşmeleri sil"""
+        await self.matches.delete_many({"job_id": job_id})
+        result = await self.job_postings.delete_one({"_id": _oid(job_id)})
+        return result.deleted_count > 0
+    
+    async def store_match(self, job_id: str, candidate_id: str, match_data: Dict) -> str:
         """Eşleşme sonucunu veritabanına kaydet"""
         match_record = {
             "job_id": job_id,
@@ -112,41 +265,105 @@ class Database:
             "notification_sent": False,
             "created_at": datetime.utcnow()
         }
-        result = self.matches.insert_one(match_record)
+        result = await self.matches.insert_one(match_record)
         return str(result.inserted_id)
     
-    def get_matches_for_job(self, job_id: str) -> List[Dict]:
+    async def store_matches_bulk(self, job_id: str, matches: List[Dict]) -> List[str]:
+        """Bir iş ilanının eşleşmelerini tek insert_many ile kaydet, sırayla ID'lerini döndür"""
+        if not matches:
+            return []
+        now = datetime.utcnow()
+        records = [
+            {
+                "job_id": job_id,
+                "candidate_id": match["candidate_id"],
+                "match_percentage": match.get("match_percentage", 0),
+                "missing_skills": match.get("missing_skills", []),
+                "explanation": match.get("explanation", ""),
+                "notification_sent": False,
+                "created_at": now
+            }
+            for match in matches
+        ]
+        result = await self.matches.insert_many(records, ordered=False)
+        return [str(i) for i in result.inserted_ids]
+    
+    async def get_matches_for_job(self, job_id: str) -> List[Dict]:
         """Bir iş ilanı için tüm eşleşmeleri al"""
         try:
-            matches = list(self.matches.find({"job_id": job_id}).sort("match_percentage", -1))
+            matches = await self.matches.find({"job_id": job_id}).sort("match_percentage", -1).to_list(length=None)
             return fix_mongo_ids(matches)
         except Exception as e:
             print(f"Eşleşmeler getirme hatası: {e}")
             return []
     
-    def get_all_candidates(self) -> List[Dict]:
+    async def count_matches(self) -> int:
+        """Toplam eşleşme sayısını al (koleksiyon metadata'sından)"""
+        return await self.matches.estimated_document_count()
+    
+    async def count_candidates(self) -> int:
+        """Toplam aday sayısını al (koleksiyon metadata'sından)"""
+        return await self.cv_metadata.estimated_document_count()
+    
+    async def count_job_postings(self) -> int:
+        """Toplam iş ilanı sayısını al (koleksiyon metadata'sından)"""
+        return await self.job_postings.estimated_document_count()
+    
+    async def count_unsent_matches(self) -> int:
+        """Bildirimi gönderilmemiş eşleşme sayısını al (notification_sent indeksi üzerinden)"""
+        return await self.matches.count_documents({"notification_sent": {"$ne": True}})
+    
+    async def get_all_candidates(self, fields: Optional[Dict] = None) -> List[Dict]:
         """Tüm adayları al (CV metadata'sından)"""
         try:
-            candidates = list(self.cv_metadata.find())
+            candidates = await self.cv_metadata.find({}, projection=fields).to_list(length=None)
             return fix_mongo_ids(candidates)
         except Exception as e:
             print(f"Adaylar getirme hatası: {e}")
             return []
     
-    def get_all_job_postings(self) -> List[Dict]:
+    async def get_candidates_matching_skills(self, required: List[str]) -> List[str]:
+        """Zorunlu becerilerin hepsine sahip adayların ID'lerini al (skills indeksi üzerinden)"""
+        try:
+            cursor = self.cv_metadata.find(
+                {"cv_data.skills": {"$all": required}},
+                projection={"_id": 1},
+                collation=_SKILL_COLLATION
+            )
+            return [str(doc["_id"]) async for doc in cursor]
+        except Exception as e:
+            print(f"Beceri filtresi hatası: {e}")
+            return []
+    
+    async def get_candidate_summaries(self, fields: Optional[Dict] = None) -> Optional[List[Dict]]:
+        """
+        Adayları eşleştirme summary'si hazır olarak al ({"_id", "summary", ...fields})
+        
+        Summary boşsa yedek metin aggregation ile veritabanında oluşturulur.
+        Pipeline başarısız olursa None döner (çağıran Python'da hazırlamalı).
+        """
+        try:
+            projection = {**(fields or {}), "summary": _SUMMARY_EXPR}
+            cursor = self.cv_metadata.aggregate([{"$project": projection}])
+            return fix_mongo_ids(await cursor.to_list(length=None))
+        except Exception as e:
+            print(f"Aday özetleri getirme hatası: {e}")
+            return None
+    
+    async def get_all_job_postings(self) -> List[Dict]:
         """Tüm iş ilanlarını al"""
         try:
-            jobs = list(self.job_postings.find().sort("created_at", -1))
+            jobs = await self.job_postings.find().sort("created_at", -1).to_list(length=None)
             return fix_mongo_ids(jobs)
         except Exception as e:
             print(f"İş ilanları getirme hatası: {e}")
             return []
     
-    def update_match_parameters(self, job_id: str, parameters: Dict) -> bool:
+    async def update_match_parameters(self, job_id: str, parameters: Dict) -> bool:
         """İş ilanı için eşleştirme parametrelerini güncelle"""
         try:
-            result = self.job_postings.update_one(
-                {"_id": ObjectId(job_id)},
+            result = await self.job_postings.update_one(
+                {"_id": _oid(job_id)},
                 {"$set": {"matching_parameters": parameters, "updated_at": datetime.utcnow()}}
             )
             return result.modified_count > 0
@@ -154,11 +371,11 @@ class Database:
             print(f"Parametreler güncelleme hatası: {e}")
             return False
     
-    def mark_notification_sent(self, match_id: str) -> bool:
+    async def mark_notification_sent(self, match_id: str) -> bool:
         """Bildirim gönderildi olarak işaretle"""
         try:
-            result = self.matches.update_one(
-                {"_id": ObjectId(match_id)},
+            result = await self.matches.update_one(
+                {"_id": _oid(match_id)},
                 {"$set": {"notification_sent": True, "notification_sent_at": datetime.utcnow()}}
             )
             return result.modified_count > 0
@@ -166,11 +383,119 @@ class Database:
             print(f"Bildirim güncelleme hatası: {e}")
             return False
     
-    def get_unsent_matches(self) -> List[Dict]:
+    async def bulk_mark_notifications_sent(self, match_ids: List[str]) -> int:
+        """Birden fazla eşleşmeyi tek sorguda bildirim gönderildi olarak işaretle"""
+        try:
+            ids = [_oid(m) for m in match_ids if ObjectId.is_valid(m)]
+            if not ids:
+                return 0
+            result = await self.matches.update_many(
+                {"_id": {"$in": ids}},
+                {"$set": {"notification_sent": True, "notification_sent_at": datetime.utcnow()}}
+            )
+            return result.modified_count
+        except Exception as e:
+            print(f"Toplu bildirim güncelleme hatası: {e}")
+            return 0
+    
+    async def get_unsent_notifications_detailed(self) -> List[Dict]:
+        """Gönderilmemiş bildirimleri iş ilanı ve aday bilgileriyle tek aggregation'da al"""
+        def lookup(collection: str, local_field: str, fields: Dict, as_field: str) -> Dict:
+            # job_id/candidate_id string saklandığı için ObjectId'ye çevrilerek eşleştirilir
+            return {"$lookup": {
+                "from": collection,
+                "let": {"ref": f"${local_field}"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": [
+                        "$_id", {"$convert": {"input": "$$ref", "to": "objectId", "onError": None}}
+                    ]}}},
+                    {"$project": fields}
+                ],
+                "as": as_field
+            }}
+        
+        try:
+            pipeline = [
+                {"$match": {"notification_sent": {"$ne": True}}},
+                lookup("job_postings", "job_id", {"title": 1, "company": 1}, "job"),
+                {"$unwind": "$job"},
+                lookup("cv_metadata", "candidate_id",
+                       {"cv_data.contact_info.email": 1, "cv_data.names": 1}, "candidate"),
+                {"$unwind": "$candidate"},
+                {"$project": {
+                    "_id": 0,
+                    "match_id": {"$toString": "$_id"},
+                    "job_title": "$job.title",
+                    "company": "$job.company",
+                    "candidate_name": {"$ifNull": [
+                        {"$arrayElemAt": ["$candidate.cv_data.names", 0]}, "Bilinmiyor"
+                    ]},
+                    "candidate_email": "$candidate.cv_data.contact_info.email",
+                    "match_percentage": 1,
+                    "created_at": 1
+                }}
+            ]
+            return await self.matches.aggregate(pipeline).to_list(length=None)
+        except Exception as e:
+            print(f"Gönderilmemiş bildirimler getirme hatası: {e}")
+            return []
+    
+    async def get_unsent_matches(self, fields: Optional[Dict] = None) -> List[Dict]:
         """Henüz bildirim gönderilmemiş eşleşmeleri al"""
         try:
-            matches = list(self.matches.find({"notification_sent": {"$ne": True}}))
+            matches = await self.matches.find({"notification_sent": {"$ne": True}}, projection=fields).to_list(length=None)
             return fix_mongo_ids(matches)
         except Exception as e:
             print(f"Gönderilmemiş eşleşmeler getirme hatası: {e}")
-            return []
\ No newline at end of file
+            return []
+    
+    async def get_cached_embeddings(self, hashes: List[str]) -> Dict[str, bytes]:
+        """Metin hash'lerine karşılık gelen kayıtlı embedding'leri al"""
+        try:
+            docs = await self.embedding_cache.find({"_id": {"$in": list(set(hashes))}}).to_list(length=None)
+            return {doc["_id"]: bytes(doc["vector"]) for doc in docs}
+        except Exception as e:
+            print(f"Embedding önbelleği okuma hatası: {e}")
+            return {}
+    
+    async def store_embeddings(self, embeddings: Dict[str, bytes]):
+        """Yeni hesaplanan embedding'leri (float32 bytes) önbelleğe yaz"""
+        if not embeddings:
+            return
+        try:
+            await self.embedding_cache.insert_many(
+                [{"_id": h, "vector": Binary(vector), "created_at": datetime.utcnow()}
+                 for h, vector in embeddings.items()],
+                ordered=False
+            )
+        except BulkWriteError:
+            # Aynı anda başka bir istek aynı hash'i yazmış olabilir
+            pass
+        except Exception as e:
+            print(f"Embedding önbelleği yazma hatası: {e}")
+    
+    async def get_rendered_emails(self, keys: List[str]) -> Dict[str, Dict]:
+        """Önbellekteki render edilmiş e-postaları ({"subject", "html"}) al"""
+        try:
+            docs = await self.rendered_emails.find({"_id": {"$in": list(set(keys))}}).to_list(length=None)
+            return {doc["_id"]: {"subject": doc["subject"], "html": doc["html"]} for doc in docs}
+        except Exception as e:
+            print(f"E-posta önbelleği okuma hatası: {e}")
+            return {}
+    
+    async def store_rendered_emails(self, emails: Dict[str, Dict]):
+        """Yeni render edilen e-postaları önbelleğe yaz"""
+        if not emails:
+            return
+        try:
+            now = datetime.utcnow()
+            await self.rendered_emails.insert_many(
+                [{"_id": key, "subject": email["subject"], "html": email["html"], "ts": now}
+                 for key, email in emails.items()],
+                ordered=False
+            )
+        except BulkWriteError:
+            # Aynı anda başka bir istek aynı anahtarı yazmış olabilir
+            pass
+        except Exception as e:
+            print(f"E-posta önbelleği yazma hatası: {e}")
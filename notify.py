@@ -1,14 +1,56 @@
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import asyncio
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from email.policy import SMTP
 import os
+import json
+import hashlib
+import re
+import time
+from functools import lru_cache
 from dotenv import load_dotenv
-from jinja2 import Template
-from typing import Dict, Optional
+from jinja2 import DictLoader, Environment, FileSystemBytecodeCache, select_autoescape
+from typing import Dict, List, Optional, Tuple
 import logging
 
 load_dotenv()
 
+# Template kaynakları NotificationService tarafından isimle kaydedilir
+_template_sources: Dict[str, str] = {}
+
+# Template'ler bu ortamda bir kez derlenir; derlenmiş kod diskte saklanıp yeniden
+# başlatmalarda tekrar kullanılır (kaynak değişirse checksum ile geçersiz olur).
+# HTML içeriğine giren değerler escape edilir.
+_bytecode_dir = os.getenv("JINJA_BYTECODE_CACHE_DIR")
+if _bytecode_dir:
+    os.makedirs(_bytecode_dir, exist_ok=True)
+_env = Environment(
+    loader=DictLoader(_template_sources),
+    auto_reload=False,
+    cache_size=400,
+    bytecode_cache=FileSystemBytecodeCache(_bytecode_dir),
+    autoescape=select_autoescape(["html"], default_for_string=True)
+)
+
+# Tek SMTP bağlantısından gönderilecek en fazla e-posta; sonra yeniden bağlanılır
+MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+
+# Toplu gönderimde paralel SMTP bağlantısı (ve gönderici thread) sayısı
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "5"))
+
+# Geçici bağlantı hatalarında deneme sayısı ve ilk bekleme (sn, her denemede iki katına çıkar);
+# kimlik doğrulama hataları tekrar denenmez
+SMTP_CONNECT_RETRIES = int(os.getenv("SMTP_CONNECT_RETRIES", "3"))
+SMTP_RETRY_BACKOFF = float(os.getenv("SMTP_RETRY_BACKOFF", "1"))
+
+# Gönderimden önce biçimi açıkça hatalı adresleri elemek için kaba kontrol
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+# Toplu gönderimde mesaj bu alıcıyla bir kez serileştirilir, To: satırı sonradan değiştirilir
+_TO_PLACEHOLDER = b"recipient@placeholder.invalid"
+
 class NotificationService:
     def __init__(self):
         # SMTP ayarları
@@ -17,6 +59,9 @@ class NotificationService:
         self.smtp_username = os.getenv("SMTP_USERNAME")
         self.smtp_password = os.getenv("SMTP_PASSWORD")
         
+        # Toplu gönderimde her thread kendi kalıcı SMTP bağlantısını kullanır
+        self._smtp_executor = ThreadPoolExecutor(max_workers=SMTP_POOL_SIZE, thread_name_prefix="smtp")
+        
         # Email template'i
         self.email_template = """
 <!DOCTYPE html>
@@ -48,21 +93,7 @@ class NotificationService:
             
             <p>CV'niz aşağıdaki iş ilanı ile <strong class="match-percentage">%{{ match_percentage }}</strong> oranında eşleşti!</p>
             
-            <div class="job-info">
-                <h2>📋 İş İlanı Detayları</h2>
-                <p><strong>Pozisyon:</strong> {{ job_title }}</p>
-                <p><strong>Şirket:</strong> {{ company_name }}</p>
-                <p><strong>Lokasyon:</strong> {{ location }}</p>
-                <p><strong>İş Tanımı:</strong></p>
-                <p>{{ job_description }}</p>
-                
-                <h3>📋 Aranan Nitelikler:</h3>
-                <ul>
-                {% for requirement in requirements %}
-                    <li>{{ requirement }}</li>
-                {% endfor %}
-                </ul>
-            </div>
+            {{ job_block|safe }}
             
             <div class="match-info">
                 <h3>📊 Eşleşme Analizi</h3>
@@ -88,21 +119,118 @@ class NotificationService:
 </body>
 </html>
         """
+        
+        # İş ilanı bölümü; aynı ilana giden tüm e-postalarda aynıdır
+        self.job_block_template = """<div class="job-info">
+                <h2>📋 İş İlanı Detayları</h2>
+                <p><strong>Pozisyon:</strong> {{ job_title }}</p>
+                <p><strong>Şirket:</strong> {{ company_name }}</p>
+                <p><strong>Lokasyon:</strong> {{ location }}</p>
+                <p><strong>İş Tanımı:</strong></p>
+                <p>{{ job_description }}</p>
+                
+                <h3>📋 Aranan Nitelikler:</h3>
+                <ul>
+                {% for requirement in requirements %}
+                    <li>{{ requirement }}</li>
+                {% endfor %}
+                </ul>
+            </div>"""
+        
+        _template_sources["match_email.html"] = self.email_template
+        _template_sources["job_block.html"] = self.job_block_template
+        self._template = _env.get_template("match_email.html")
+        self._job_template = _env.get_template("job_block.html")
+        # Şablon metni değişirse render önbelleğindeki eski e-postalar kullanılmaz
+        self._template_version = hashlib.sha1(
+            (self.email_template + self.job_block_template).encode()
+        ).hexdigest()[:12]
+        
+        # Toplu gönderimde iş ilanı bölümü ilan başına bir kez render edilir
+        self._render_job_block = lru_cache(maxsize=256)(self._render_job_block_uncached)
+
+    def _connect(self) -> smtplib.SMTP:
+        """STARTTLS ve login yapılmış SMTP bağlantısı aç"""
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        try:
+            server.starttls()
+            server.login(self.smtp_username, self.smtp_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _connect_with_retry(self) -> smtplib.SMTP:
+        """SMTP bağlantısı aç; geçici hatalarda artan beklemeyle tekrar dene"""
+        for attempt in range(SMTP_CONNECT_RETRIES):
+            try:
+                return self._connect()
+            except smtplib.SMTPAuthenticationError:
+                # Yanlış kimlik bilgisiyle tekrar giriş denemek hesabı kilitletebilir
+                raise
+            except OSError as e:
+                if attempt == SMTP_CONNECT_RETRIES - 1:
+                    raise
+                delay = SMTP_RETRY_BACKOFF * 2 ** attempt
+                print(f"SMTP bağlantı hatası, {delay:.0f} sn sonra tekrar denenecek: {e}")
+                time.sleep(delay)
+        return self._connect()
+
+    @staticmethod
+    def _drain(messages: "queue.Queue") -> List[Tuple[int, bool]]:
+        """Kuyrukta kalan mesajları gönderilmeden başarısız say"""
+        outcomes = []
+        while True:
+            try:
+                position, _, _ = messages.get_nowait()
+            except queue.Empty:
+                return outcomes
+            outcomes.append((position, False))
+
+    @staticmethod
+    def _disconnect(server: Optional[smtplib.SMTP]):
+        """SMTP bağlantısını kapat (kopmuşsa sessizce)"""
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _build_message(self, to_email: str, subject: str, html_body: str) -> EmailMessage:
+        """HTML gövdeli e-posta mesajını oluştur (SMTP policy: CRLF, başlıklar tek seferde katlanır)"""
+        msg = EmailMessage(policy=SMTP)
+        msg["From"] = self.smtp_username
+        msg["To"] = to_email
+        msg["Subject"] = subject
+
+        # Quoted-printable: çoğunlukla ASCII olan HTML'de base64'ten küçük, 8BITMIME gerektirmez
+        msg.set_content("Bu e-postayı görüntülemek için HTML destekli bir e-posta istemcisi kullanın.",
+                        cte="quoted-printable")
+        msg.add_alternative(html_body, subtype="html", cte="quoted-printable")
+        return msg
+
+    def _serialize_message(self, subject: str, html_body: str) -> bytes:
+        """Mesajı yer tutucu alıcıyla bir kez serileştir"""
+        return self._build_message(_TO_PLACEHOLDER.decode(), subject, html_body).as_bytes()
+
+    def _address_message(self, raw: bytes, to_email: str, subject: str, html_body: str) -> bytes:
+        """Serileştirilmiş mesajın sadece To: başlığını alıcıya göre değiştir"""
+        if "\r" in to_email or "\n" in to_email:
+            raise ValueError(f"Geçersiz e-posta adresi: {to_email!r}")
+        try:
+            to_bytes = to_email.encode("ascii")
+        except UnicodeEncodeError:
+            # ASCII olmayan adreslerde başlık kodlanmalı; mesaj baştan oluşturulur
+            return self._build_message(to_email, subject, html_body).as_bytes()
+        return raw.replace(b"To: " + _TO_PLACEHOLDER + b"\r\n", b"To: " + to_bytes + b"\r\n", 1)
 
     def send_email(self, to_email: str, subject: str, html_body: str) -> bool:
         """E-posta gönder"""
         try:
-            msg = MIMEMultipart('alternative')
-            msg["From"] = self.smtp_username
-            msg["To"] = to_email
-            msg["Subject"] = subject
-
-            html_part = MIMEText(html_body, "html", "utf-8")
-            msg.attach(html_part)
+            msg = self._build_message(to_email, subject, html_body)
 
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
+            with self._connect() as server:
                 server.send_message(msg)
 
             print(f"E-posta başarıyla gönderildi: {to_email}")
@@ -112,6 +240,47 @@ class NotificationService:
             print(f"E-posta gönderilirken hata oluştu: {e}")
             return False
 
+    def _render_job_block_uncached(self, job_title: str, company_name: str, location: str,
+                                   job_description: str, requirements: Tuple[str, ...]) -> str:
+        """İş ilanı HTML bölümünü render et (argümanlar hashable olmalı)"""
+        return self._job_template.render(
+            job_title=job_title,
+            company_name=company_name,
+            location=location,
+            job_description=job_description,
+            requirements=requirements
+        )
+
+    @staticmethod
+    def _candidate_name(candidate_data: Optional[Dict]) -> Optional[str]:
+        """E-postada hitap için adayın ilk ismi (yoksa None)"""
+        if candidate_data and candidate_data.get("cv_data", {}).get("names"):
+            return candidate_data["cv_data"]["names"][0]
+        return None
+
+    def _render_match_notification(self, job_data: Dict, match_data: Dict, candidate_data: Dict = None) -> Tuple[str, str]:
+        """Eşleşme bildiriminin konu ve HTML gövdesini oluştur"""
+        candidate_name = self._candidate_name(candidate_data)
+        
+        # İş ilanı bölümü önbellekten, adaya özel kısım her seferinde render edilir
+        job_block = self._render_job_block(
+            job_data.get("title", "Belirtilmemiş"),
+            job_data.get("company", "Belirtilmemiş"),
+            job_data.get("location", "Belirtilmemiş"),
+            job_data.get("description", "Açıklama bulunmuyor"),
+            tuple(job_data.get("requirements", []))
+        )
+        html_body = self._template.render(
+            candidate_name=candidate_name,
+            match_percentage=round(match_data.get("match_percentage", 0), 1),
+            job_block=job_block,
+            explanation=match_data.get("explanation", ""),
+            missing_skills=match_data.get("missing_skills", [])
+        )
+        
+        subject = f"🎯 Yeni İş Fırsatı - %{round(match_data.get('match_percentage', 0), 1)} Eşleşme"
+        return subject, html_body
+
     def send_match_notification(self, candidate_email: str, job_data: Dict, match_data: Dict, candidate_data: Dict = None) -> bool:
         """
         İş eşleşmesi bildirimi gönder
@@ -123,39 +292,86 @@ class NotificationService:
             candidate_data: Aday verileri (opsiyonel)
         """
         try:
-            # Template'i render et
-            template = Template(self.email_template)
-            
-            # Aday ismini bul
-            candidate_name = None
-            if candidate_data and candidate_data.get("cv_data", {}).get("names"):
-                names = candidate_data["cv_data"]["names"]
-                if names:
-                    candidate_name = names[0]
-            
-            html_body = template.render(
-                candidate_name=candidate_name,
-                match_percentage=round(match_data.get("match_percentage", 0), 1),
-                job_title=job_data.get("title", "Belirtilmemiş"),
-                company_name=job_data.get("company", "Belirtilmemiş"),
-                location=job_data.get("location", "Belirtilmemiş"),
-                job_description=job_data.get("description", "Açıklama bulunmuyor"),
-                requirements=job_data.get("requirements", []),
-                explanation=match_data.get("explanation", ""),
-                missing_skills=match_data.get("missing_skills", [])
-            )
-            
-            subject = f"🎯 Yeni İş Fırsatı - %{round(match_data.get('match_percentage', 0), 1)} Eşleşme"
-            
+            subject, html_body = self._render_match_notification(job_data, match_data, candidate_data)
             return self.send_email(candidate_email, subject, html_body)
             
         except Exception as e:
             print(f"Eşleşme bildirimi gönderilirken hata: {e}")
             return False
 
-    def send_bulk_notifications(self, notifications: list) -> Dict[str, int]:
+    def _send_worker(self, messages: "queue.Queue") -> List[Tuple[int, bool]]:
         """
-        Toplu bildirim gönder
+        Kuyruktaki hazır mesajları tek kalıcı SMTP bağlantısı üzerinden gönder
+        
+        Kuyruk boşalana kadar çalışır; bağlantı MAX_MESSAGES_PER_CONNECTION
+        mesajdan sonra ya da sunucu bağlantıyı kapattığında yeniden açılır.
+        Bağlantı ya da giriş kurulamazsa kalan mesajlar başarısız sayılır ve
+        worker durur. Dönen liste (sıra, başarılı mı) çiftlerinden oluşur.
+        """
+        outcomes = []
+        server = None
+        sent_on_connection = 0
+        try:
+            while True:
+                try:
+                    position, to_email, raw = messages.get_nowait()
+                except queue.Empty:
+                    break
+                
+                try:
+                    if server is None or sent_on_connection >= MAX_MESSAGES_PER_CONNECTION:
+                        self._disconnect(server)
+                        server = None
+                        server = self._connect_with_retry()
+                        sent_on_connection = 0
+                    
+                    try:
+                        server.sendmail(self.smtp_username, to_email, raw)
+                    except smtplib.SMTPServerDisconnected:
+                        # Sunucu bağlantıyı kapattıysa bir kez yeniden bağlanıp tekrar dene
+                        self._disconnect(server)
+                        server = None
+                        server = self._connect_with_retry()
+                        sent_on_connection = 0
+                        server.sendmail(self.smtp_username, to_email, raw)
+                    
+                    sent_on_connection += 1
+                    print(f"E-posta başarıyla gönderildi: {to_email}")
+                    outcomes.append((position, True))
+                    
+                except Exception as e:
+                    print(f"Bildirim gönderim hatası: {e}")
+                    outcomes.append((position, False))
+                    if server is None:
+                        # Bağlantı/giriş başarısız: her mesaj için yeniden giriş denenmez
+                        outcomes.extend(self._drain(messages))
+                        break
+        finally:
+            self._disconnect(server)
+        
+        return outcomes
+
+    def _render_cache_key(self, job_data: Dict, match_data: Dict, candidate_data: Dict = None) -> str:
+        """
+        Render önbelleği anahtarı: e-postaya giren tüm alanlar ve şablon sürümü;
+        ilan ya da aday bilgisi değişince eski HTML TTL dolmadan da kullanılmaz
+        """
+        payload = {
+            "template": self._template_version,
+            "job_id": match_data.get("job_id"),
+            "candidate_id": match_data.get("candidate_id"),
+            "match_percentage": round(match_data.get("match_percentage", 0), 1),
+            "explanation": match_data.get("explanation", ""),
+            "missing_skills": match_data.get("missing_skills", []),
+            "candidate_name": self._candidate_name(candidate_data),
+            "job": [job_data.get(field) for field in ("title", "company", "location", "description", "requirements")]
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    async def send_bulk_notifications(self, notifications: list, max_concurrency: int = SMTP_POOL_SIZE,
+                                      render_cache=None) -> Dict[str, int]:
+        """
+        Toplu bildirim gönder (SMTP_POOL_SIZE'ı aşmayan sayıda kalıcı bağlantıyla)
         
         Args:
             notifications: Liste şeklinde bildirim verileri
@@ -163,35 +379,95 @@ class NotificationService:
                 'candidate_email': str,
                 'job_data': dict,
                 'match_data': dict,
-                'candidate_data': dict
+                'candidate_data': dict,
+                'match_id': str (opsiyonel)
             }
+            max_concurrency: Aynı anda açık tutulacak SMTP bağlantısı sayısı
+            render_cache: Verilirse render edilmiş e-postalar bu Database'in
+                rendered_emails koleksiyonundan okunur/yazılır
         
         Returns:
             {
-                'sent': int,        # Başarıyla gönderildi
-                'failed': int,      # Başarısız
-                'total': int        # Toplam
+                'sent': int,            # Başarıyla gönderildi
+                'failed': int,          # Başarısız
+                'total': int,           # Toplam
+                'sent_match_ids': list  # Başarıyla gönderilen eşleşme ID'leri
             }
         """
-        results = {'sent': 0, 'failed': 0, 'total': len(notifications)}
+        results = {'sent': 0, 'failed': 0, 'total': len(notifications), 'sent_match_ids': []}
+        
+        # SMTP ayarları eksikse hiçbir bildirim için render ya da bağlantı denenmez
+        if not notifications or not self.validate_email_config():
+            results['failed'] = results['total']
+            return results
+        
+        # Biçimi geçersiz adresler render edilmeden ve SMTP turu harcanmadan elenir
+        positions = []
+        for position, notification in enumerate(notifications):
+            if _EMAIL_RE.fullmatch(notification.get('candidate_email') or ''):
+                positions.append(position)
+            else:
+                print(f"Geçersiz e-posta adresi atlandı: {notification.get('candidate_email')!r}")
+        
+        # Daha önce render edilmiş e-postalar tek sorguda alınır
+        keys = {
+            p: self._render_cache_key(notifications[p]['job_data'], notifications[p]['match_data'],
+                                      notifications[p].get('candidate_data'))
+            for p in positions
+        } if render_cache else {}
+        cached = await render_cache.get_rendered_emails(list(keys.values())) if keys else {}
+        new_renders = {}
+        serialized = {}
         
-        for notification in notifications:
+        # HTML gövdeleri ve MIME serileştirme (CPU işi) önceden yapılır, thread'ler sadece ağ I/O yapar;
+        # aynı konu/gövde tek sefer kodlanır, alıcıya göre sadece To: satırı değişir
+        messages: "queue.Queue" = queue.Queue()
+        for position in positions:
+            notification = notifications[position]
             try:
-                success = self.send_match_notification(
-                    notification['candidate_email'],
-                    notification['job_data'],
-                    notification['match_data'],
-                    notification.get('candidate_data')
-                )
-                
-                if success:
-                    results['sent'] += 1
+                key = keys.get(position)
+                if key in cached:
+                    subject, html_body = cached[key]["subject"], cached[key]["html"]
                 else:
-                    results['failed'] += 1
-                    
+                    subject, html_body = self._render_match_notification(
+                        notification['job_data'],
+                        notification['match_data'],
+                        notification.get('candidate_data')
+                    )
+                    if key:
+                        new_renders[key] = {"subject": subject, "html": html_body}
+                raw = serialized.get((subject, html_body))
+                if raw is None:
+                    raw = serialized[(subject, html_body)] = self._serialize_message(subject, html_body)
+                to_email = notification['candidate_email']
+                messages.put((position, to_email, self._address_message(raw, to_email, subject, html_body)))
             except Exception as e:
-                print(f"Bildirim gönderim hatası: {e}")
-                results['failed'] += 1
+                print(f"Bildirim hazırlama hatası: {e}")
+        
+        if new_renders:
+            await render_cache.store_rendered_emails(new_renders)
+        
+        # Her worker kendi bağlantısıyla ortak kuyruktan mesaj çeker
+        worker_count = min(max_concurrency, SMTP_POOL_SIZE, messages.qsize())
+        loop = asyncio.get_running_loop()
+        worker_outcomes = await asyncio.gather(
+            *(loop.run_in_executor(self._smtp_executor, self._send_worker, messages) for _ in range(worker_count)),
+            return_exceptions=True
+        )
+        
+        for outcomes in worker_outcomes:
+            if isinstance(outcomes, Exception):
+                print(f"Bildirim gönderim hatası: {outcomes}")
+                continue
+            for position, success in outcomes:
+                if success:
+                    results['sent'] += 1
+                    match_id = notifications[position].get('match_id')
+                    if match_id:
+                        results['sent_match_ids'].append(match_id)
+        
+        # Hazırlanamayan, gönderilemeyen ya da worker hatasıyla sonuçsuz kalanlar
+        results['failed'] = results['total'] - results['sent']
         
         return results
 
@@ -1,16 +1,251 @@
 import faiss
 import numpy as np
+import asyncio
+import torch
 from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Tuple, Optional
 import json
+import os
+import pickle
 import re
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# Opsiyonel: pyahocorasick varsa anahtar kelimeler tek geçişte bulunur
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Logging ayarlarını yapılandır
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# FAISS OpenMP thread sayısı; varsayılan çekirdeklerin yarısı, çünkü aramalar
+# thread havuzundan eşzamanlı gelir ve encode da aynı çekirdekleri kullanır
+FAISS_NUM_THREADS = int(os.getenv("FAISS_NUM_THREADS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+faiss.omp_set_num_threads(FAISS_NUM_THREADS)
+
+# index_type="auto" eşikleri: küçük havuzda tam tarama (çok küçükse float32, değilse
+# SQ8; tek/çok az vektörle SQ aralığı öğrenilemez), orta boyda HNSW, çok büyükte IVF-PQ
+EXACT_MAX_CANDIDATES = 1_000
+FLAT_MAX_CANDIDATES = 5_000
+HNSW_MAX_CANDIDATES = 200_000
+
+# HNSW grafı parametreleri: düğüm başına bağlantı ve arama/kurulum genişliği
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+# create_index varsayılan indeks türü ("auto" ya da _new_index'in kabul ettiği türlerden biri)
+DEFAULT_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+
+# IVF-PQ: aranacak küme sayısı ve vektör başına PQ alt kuantizer (byte) sayısı
+IVF_NPROBE = 16
+PQ_SUBQUANTIZERS = 64
+
+# Büyük havuzlarda arama GPU'ya taşınır (faiss-gpu ve CUDA varsa); GPU'ya kopyalanabilen
+# türler IVF-PQ ve tam tarama "flat"tır (auto eşiklerinde flat sadece 1000 altında seçildiğinden
+# büyük havuzda flat için FAISS_INDEX_TYPE=flat gerekir), diğerleri CPU'da kalır
+FAISS_GPU_MIN_CANDIDATES = int(os.getenv("FAISS_GPU_MIN_CANDIDATES", "20000"))
+FAISS_NUM_GPUS = faiss.get_num_gpus() if hasattr(faiss, "get_num_gpus") else 0
+
+# Eksik beceri analizinde sorguda aranan teknoloji anahtar kelimeleri
+TECH_KEYWORDS = (
+    'python', 'java', 'javascript', 'react', 'angular', 'vue', 'node.js',
+    'docker', 'kubernetes', 'aws', 'azure', 'git', 'sql', 'mongodb',
+    'machine learning', 'ai', 'data science', 'html', 'css', 'php',
+    'django', 'flask', 'spring', 'laravel', 'tensorflow', 'pytorch',
+    'opencv', 'pandas', 'numpy', 'scikit-learn', 'tableau', 'powerbi'
+)
+
+# Beceri eşleştirmesinde kelime: Unicode harf dizisi (rakam, _ ve noktalama ayraçtır)
+_WORD_RE = re.compile(r"[^\W\d_]+")
+
+def _word_text(text: str) -> str:
+    """Metni ' kelime kelime ' biçimine getir; ' a b ' in metin kontrolü kelime sınırına uyar"""
+    # Türkçe 'İ'.lower() birleşik nokta (U+0307) üretip kelimeyi böler
+    return f" {' '.join(_WORD_RE.findall(text.replace('İ', 'i').lower()))} "
+
+# _clean_query desenleri (sorgu başına yeniden ayrıştırılmaz)
+_WHITESPACE_RE = re.compile(r'\s+')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_JUNK_RE = re.compile(r'[^\w\s.,;:-]')
+
+# Anahtar kelimelerin kelime biçimleri (node.js -> ' node js ')
+_TECH_WORDS = {tech: _word_text(tech) for tech in TECH_KEYWORDS}
+
+# Tüm anahtar kelimeler için tek otomat: metin anahtar kelime sayısından bağımsız tek geçişte taranır
+_TECH_AUTOMATON = None
+if ahocorasick is not None:
+    _TECH_AUTOMATON = ahocorasick.Automaton()
+    for _tech, _tech_words in _TECH_WORDS.items():
+        _TECH_AUTOMATON.add_word(_tech_words, _tech)
+    _TECH_AUTOMATON.make_automaton()
+
+# Açıklamadaki uyumluluk seviyeleri: eşikler artan sırada, etiketler eşik aralıklarına karşılık gelir
+_LEVEL_THRESHOLDS = np.array([40.0, 60.0, 80.0])
+_LEVEL_LABELS = ("Düşük uyumluluk", "Orta seviye uyumluluk", "Yüksek uyumluluk", "Çok yüksek uyumluluk")
+
+# encode batch boyutu; sentence-transformers batch'leri uzunluğa göre sıralayıp padding'i azaltır
+ENCODE_BATCH_SIZE = 64
+
+# Süreç içi embedding önbelleğinin (L1) maksimum kayıt sayısı
+EMBED_CACHE_SIZE = 10_000
+
+# Embedding arka ucu: "torch" (varsayılan) ya da "onnx" (int8 nicemlenmiş model,
+# onnxruntime gerekir; ilk açılışta EMBEDDING_ONNX_DIR altına dışa aktarılır)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "./models")
+
+# PyTorch arka ucunun cihazı; boşsa CUDA varsa GPU (fp16), yoksa CPU kullanılır
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE") or ("cuda" if torch.cuda.is_available() else "cpu")
+
+# CPU'da encode başına thread sayısı; FAISS_NUM_THREADS gibi varsayılan çekirdeklerin yarısı,
+# çünkü encode'lar zaten cpu_count genişliğindeki thread havuzundan eşzamanlı çalışır
+EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+
+class _OnnxEncoder:
+    """
+    SentenceTransformer.encode ile uyumlu, ONNX Runtime üzerinde çalışan encoder
+    
+    Sadece Transformer + ortalama pooling (+ Normalize) modüllerinden oluşan
+    modelleri destekler (all-MiniLM-L6-v2 gibi). int8 dinamik nicemleme CPU'da
+    encode'u hızlandırır ve ağırlık belleğini dörtte birine indirir; vektörler
+    float32 modelden biraz farklıdır.
+    """
+    def __init__(self, model: SentenceTransformer, model_name: str):
+        import onnxruntime as ort
+        from sentence_transformers.models import Normalize, Pooling, Transformer
+        
+        modules = list(model._modules.values())
+        if not (isinstance(modules[0], Transformer) and len(modules) > 1 and isinstance(modules[1], Pooling)
+                and modules[1].get_config_dict().get("pooling_mode_mean_tokens")
+                and all(isinstance(m, Normalize) for m in modules[2:])):
+            raise ValueError("ONNX arka ucu sadece ortalama pooling kullanan modelleri destekler")
+        
+        transformer = modules[0]
+        self.model_name = model_name
+        self.tokenizer = transformer.tokenizer
+        self.max_seq_length = transformer.max_seq_length
+        self._normalize = len(modules) > 2
+        self._dimension = model.get_sentence_embedding_dimension()
+        
+        model_dir = os.path.join(EMBEDDING_ONNX_DIR, model_name.replace("/", "__"))
+        path = os.path.join(model_dir, "model.int8.onnx")
+        optimized_path = os.path.join(model_dir, "model.int8.opt.onnx")
+        if not os.path.exists(path):
+            self._export(transformer, path)
+        
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = EMBEDDING_NUM_THREADS
+        if os.path.exists(optimized_path):
+            # Operatör birleştirmeleri önceki açılışta yapıldı; graf olduğu gibi yüklenir
+            path = optimized_path
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        else:
+            # İlk açılışta tam optimizasyon uygulanır ve sonuç sonraki açılışlar için saklanır
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.optimized_model_filepath = optimized_path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input_names = [i.name for i in self.session.get_inputs()]
+    
+    def _export(self, transformer, path: str):
+        """Transformer'ı ONNX'e aktar ve ağırlıkları int8'e nicemle"""
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        
+        logger.info(f"Model ONNX'e aktarılıyor: {path}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        sample = self.tokenizer(["örnek metin"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        fp32_path = path.replace(".int8.onnx", ".onnx")
+        
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer.auto_model.eval(),
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+                opset_version=14
+            )
+        quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+        os.remove(fp32_path)  # Sadece nicemlenmiş model kullanılır
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dimension
+    
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               normalize_embeddings: bool = False, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """Metinleri encode et (uzunluğa göre sıralı batch'ler: daha az padding)"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        
+        embeddings = np.empty((len(sentences), self._dimension), dtype=np.float32)
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        for start in range(0, len(sentences), batch_size):
+            batch = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [sentences[i] for i in batch], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            hidden = self.session.run(None, {name: encoded[name].astype(np.int64) for name in self._input_names})[0]
+            
+            # Ortalama pooling (padding token'ları hariç)
+            mask = encoded["attention_mask"][..., np.newaxis].astype(np.float32)
+            embeddings[batch] = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        
+        if self._normalize or normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings[0] if single else embeddings
+
+@lru_cache(maxsize=None)
+def _load_model(model_name: str):
+    """Modeli süreç başına bir kez yükle; tüm VectorMatcher örnekleri paylaşır"""
+    if EMBEDDING_BACKEND == "onnx":
+        try:
+            return _OnnxEncoder(SentenceTransformer(model_name, device="cpu"), model_name)
+        except Exception as e:
+            logger.warning(f"ONNX arka ucu kullanılamıyor, PyTorch ile devam ediliyor: {e}")
+    
+    model = SentenceTransformer(model_name, device=EMBEDDING_DEVICE)
+    if EMBEDDING_DEVICE.startswith("cuda"):
+        # GPU'da yarı hassasiyet: model belleği yarıya iner, encode belirgin hızlanır
+        model.half()
+    else:
+        torch.set_num_threads(EMBEDDING_NUM_THREADS)
+    logger.info(f"Embedding modeli {EMBEDDING_DEVICE} üzerinde çalışacak")
+    return model
+
 class VectorMatcher:
+    """
+    Aday summary embedding'leri üzerinde FAISS ile benzerlik araması
+
+    İndeks türü aday sayısına göre seçilir (index_type="auto"): çok küçük
+    havuzda float32 tam tarama ("flat"), küçük havuzda SQ8 tam tarama ("sq8"),
+    orta boyda HNSW ("hnsw"), çok büyük havuzda IVF-PQ ("ivfpq", vektör başına
+    PQ_SUBQUANTIZERS byte, ~%95 recall). Hepsi birim vektörler üzerinde iç
+    çarpım (kosinüs) kullanır.
+
+    "fp16" (sadece açıkça seçilirse) boyut başına 2 byte tutan tam taramadır:
+    bellek yarıya iner, skorlar float32 ile neredeyse aynıdır ve eğitim gerekmez.
+
+    "sq8" ve "hnsw" indeksleri 8-bit skaler kuantize (SQ8) vektörler tutar:
+    her boyut float32 yerine 1 byte saklanır, bellek ve bant genişliği ~4 kat
+    azalır. Kuantizasyon hatası benzerlik skorlarını hafifçe bozar; sıralamadaki etki
+    genellikle küçüktür ancak birbirine çok yakın skorlu adayların yeri
+    değişebilir. Eğitim min/max aralığını indeks kurulurken mevcut adaylardan
+    öğrenir; sonradan eklenen ve bu aralığın dışına düşen değerler kırpılır,
+    tam yeniden oluşturma (create_index) aralığı günceller.
+
+    "flat", "fp16", "sq8" ve "ivfpq" indekslerinde aday güncelleme/silme sadece ilgili
+    satırı değiştirir; HNSW silmeyi desteklemediğinden orada indeks yeniden kurulur.
+    """
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
         """
         Vektör eşleştiriciyi başlat
@@ -20,7 +255,8 @@ class VectorMatcher:
         """
         try:
             logger.info(f"Sentence Transformer modeli yükleniyor: {model_name}")
-            self.model = SentenceTransformer(model_name)
+            self.model_name = model_name
+            self.model = _load_model(model_name)
             self.dimension = self.model.get_sentence_embedding_dimension()
             logger.info(f"Model başarıyla yüklendi. Boyut: {self.dimension}")
         except Exception as e:
@@ -29,52 +265,456 @@ class VectorMatcher:
         
         self.index = None
         self.candidates = []
+        # Arama sonuçlarında sadece dokunulan alanlar, FAISS sırasıyla paralel diziler
+        # Silinen adayların satırı None olarak kalır (satır numarası = FAISS etiketi)
+        self._ids: List[Optional[str]] = []  # indeksteki sıra -> aday ID
+        self._positions: Dict[str, int] = {}  # aday ID -> indeksteki sıra
+        self._skill_techs: List[Optional[frozenset]] = []  # candidates ile paralel, adayın teknolojileri
+        self._profiles: List[Optional[str]] = []  # candidates ile paralel, açıklamanın adaya özel kısmı
+        
+        # İndeks, thread havuzundaki arama ve güncellemeler arasında paylaşılır
+        self._lock = threading.RLock()
+        
+        # Tekrarlanan sorgu/summary metinleri için LRU embedding önbelleği
+        # (kalıcı L2 önbellek MongoDB'deki embedding_cache koleksiyonudur)
+        self._embed_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        
+        # Kullanılan FAISS indeks türü ("flat", "fp16", "sq8", "hnsw" ya da "ivfpq")
+        self.index_type: Optional[str] = None
+        
+        # load_index(mmap=True) sonrası indeks dosyadan eşlenir ve yerinde değiştirilemez
+        self._index_read_only = False
         
-    def create_index(self, candidates: List[Dict]):
+        # Aramalar için indeksin GPU kopyası; self.index her değiştiğinde None yapılır
+        # ve bir sonraki aramada yeniden kopyalanır (güncellemeler CPU indeksine yapılır)
+        self._gpu_index = None
+        self._gpu_resources = None
+        
+    def create_index(self, candidates: List[Dict], index_type: str = DEFAULT_INDEX_TYPE):
         """
         Aday belgelerinden FAISS indeksi oluştur
         
         Args:
             candidates: Aday listesi, her aday 'summary' alanına sahip olmalı
+            index_type: "auto", "flat", "fp16", "sq8", "hnsw" ya da "ivfpq"
         """
         if not candidates:
             raise ValueError("Aday listesi boş")
         
         try:
-            self.candidates = candidates
-            
-            # Summary metinlerini hazırla
-            texts = []
-            for i, candidate in enumerate(candidates):
-                summary = candidate.get("summary", "")
-                
-                # Summary boşsa diğer alanlardan metin oluştur
-                if not summary or len(summary.strip()) < 10:
-                    summary = self._create_fallback_text(candidate)
-                
-                texts.append(summary)
-                logger.info(f"Aday {i+1}: {summary[:100]}...")
+            embeddings = self._encode_candidates(candidates)
+            self._build_index(candidates, embeddings, index_type)
             
-            # Metinleri vektörlere çevir
-            logger.info(f"{len(texts)} aday için embedding oluşturuluyor...")
-            embeddings = self.model.encode(texts, show_progress_bar=True)
+        except Exception as e:
+            logger.error(f"İndeks oluşturma hatası: {e}")
+            raise Exception(f"Vektör indeksi oluşturulamadı: {e}")
+    
+    async def create_index_cached(self, candidates: List[Dict], db, index_type: str = DEFAULT_INDEX_TYPE):
+        """
+        FAISS indeksini oluştur; summary embedding'lerini MongoDB
+        embedding önbelleğinden al, sadece önbellekte olmayanları hesapla
+        
+        Args:
+            candidates: Aday listesi, her aday 'summary' alanına sahip olmalı
+            db: Embedding önbelleğine erişen Database örneği
+            index_type: "auto", "flat", "fp16", "sq8", "hnsw" ya da "ivfpq"
+        """
+        if not candidates:
+            raise ValueError("Aday listesi boş")
+        
+        try:
+            texts = self._candidate_texts(candidates)
+            hashes = [self.text_hash(text) for text in texts]
             
-            # FAISS indeksini oluştur
-            self.index = faiss.IndexFlatL2(self.dimension)
-            embeddings_array = np.array(embeddings).astype('float32')
+            cached = await db.get_cached_embeddings(hashes)
             
-            # NaN değerlerini kontrol et
-            if np.isnan(embeddings_array).any():
-                logger.warning("Embedding'lerde NaN değerler tespit edildi, temizleniyor...")
-                embeddings_array = np.nan_to_num(embeddings_array)
+            # Önbellekte olmayan metinleri tek seferde encode et
+            missing = {h: text for h, text in zip(hashes, texts) if h not in cached}
+            if missing:
+                logger.info(f"{len(missing)} aday için embedding oluşturuluyor ({len(cached)} önbellekten)...")
+                encoded = self._encode(list(missing.values()))
+                new_entries = {h: vec.tobytes() for h, vec in zip(missing.keys(), encoded)}
+                await db.store_embeddings(new_entries)
+                cached.update(new_entries)
             
-            self.index.add(embeddings_array)
-            logger.info(f"FAISS indeksi oluşturuldu. Toplam aday: {self.index.ntotal}")
+            embeddings = np.stack([np.frombuffer(cached[h], dtype='float32') for h in hashes])
+            self._build_index(candidates, embeddings, index_type)
             
         except Exception as e:
             logger.error(f"İndeks oluşturma hatası: {e}")
             raise Exception(f"Vektör indeksi oluşturulamadı: {e}")
     
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Metinleri birim uzunluklu, bitişik float32 matrise encode et (ek kopya yok)"""
+        embeddings = self.model.encode(
+            texts, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False,
+            normalize_embeddings=True, convert_to_numpy=True
+        )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    
+    def _encode_candidates(self, candidates: List[Dict], known: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+        """
+        Adayların embedding matrisini oluştur; aynı metinler (ör. boş özetlerin ortak
+        fallback'i) tek kez, known'da vektörü hazır olan metinler hiç encode edilmez
+        """
+        texts = self._candidate_texts(candidates)
+        row_of = {}
+        inverse = np.fromiter((row_of.setdefault(text, len(row_of)) for text in texts),
+                              dtype=np.int64, count=len(texts))
+        unique_texts = list(row_of)
+        to_encode = [text for text in unique_texts if not known or text not in known]
+        logger.info(f"{len(texts)} aday için embedding oluşturuluyor ({len(to_encode)} benzersiz metin)...")
+        if len(to_encode) == len(unique_texts):
+            unique_embeddings = self._encode(unique_texts)
+        else:
+            encoded = dict(zip(to_encode, self._encode(to_encode))) if to_encode else {}
+            unique_embeddings = np.stack([known[t] if t in known else encoded[t] for t in unique_texts])
+        return unique_embeddings if len(unique_texts) == len(texts) else unique_embeddings[inverse]
+    
+    def _candidate_texts(self, candidates: List[Dict]) -> List[str]:
+        """Adayların embedding'e girecek metinlerini hazırla"""
+        texts = [self._candidate_text(candidate) for candidate in candidates]
+        # Aday başına satır sadece DEBUG açıksa biçimlenir; toplam sayı create_index'te INFO'da
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, summary in enumerate(texts):
+                logger.debug("Aday %d: %.100s...", i + 1, summary)
+        return texts
+    
+    def _build_index(self, candidates: List[Dict], embeddings, index_type: str = "auto",
+                     expected: Optional[list] = None) -> bool:
+        """
+        Hazır embedding'lerden FAISS indeksini kur
+        
+        expected verilirse yeni indeks sadece self.candidates hâlâ o liste ise
+        devreye alınır (kurulum sırasında başka güncelleme geldiyse False)
+        """
+        # FAISS indeksini oluştur
+        if index_type == "auto":
+            index_type = self._auto_index_type(len(candidates))
+        index = self._new_index(index_type, len(candidates))
+        # Zaten bitişik float32 ise kopya yok; NaN/inf tek geçişte yerinde sıfırlanır
+        embeddings_array = np.ascontiguousarray(embeddings, dtype=np.float32)
+        np.nan_to_num(embeddings_array, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        
+        # İç çarpım = kosinüs benzerliği olması için birim uzunluğa getir
+        # (önbellekte normalize edilmeden saklanmış eski vektörler de düzelir)
+        faiss.normalize_L2(embeddings_array)
+        
+        # SQ8 aralığını / IVF kümelerini ve PQ kod kitaplarını mevcut vektörlerden öğren
+        index.train(embeddings_array)
+        self._add_rows(index, embeddings_array, 0)
+        
+        # Hazır indeksi tek adımda devreye al
+        ids = [str(c.get("_id", "")) for c in candidates]
+        positions = {candidate_id: i for i, candidate_id in enumerate(ids)}
+        skill_techs = [self._candidate_techs(c) for c in candidates]
+        profiles = [self._candidate_profile(c) for c in candidates]
+        with self._lock:
+            if expected is not None and self.candidates is not expected:
+                return False
+            self.index = index
+            self.index_type = index_type
+            self.candidates = list(candidates)  # Çağıranın listesindeki sonraki değişiklikler indekse sızmaz
+            self._ids = ids
+            self._positions = positions
+            self._skill_techs = skill_techs
+            self._profiles = profiles
+            self._index_read_only = False
+            self._gpu_index = None
+        logger.info(f"FAISS indeksi oluşturuldu ({index_type}). Toplam aday: {index.ntotal}")
+        return True
+    
+    def _rebuild(self, change, known: Optional[Dict[str, np.ndarray]] = None) -> bool:
+        """
+        İndeksi yerinde değiştirilemediğinde (HNSW ya da salt okunur) kilit dışında
+        yeniden kur; aramalar sadece yeni indeks devreye alınırken bekler
+        
+        change(candidates) kilit altında çağrılır ve aday listesinin değişmiş kopyasını
+        döndürür (None: değişiklik yok). Kurulum sürerken başka bir güncelleme
+        gelirse güncel listeyle tekrar denenir.
+        """
+        while True:
+            with self._lock:
+                snapshot = self.candidates
+                candidates = change(snapshot)
+            if candidates is None:
+                return False
+            live = [c for c in candidates if c is not None]
+            if not live:
+                raise ValueError("Aday listesi boş")
+            embeddings = self._encode_candidates(live, known)
+            if self._build_index(live, embeddings, DEFAULT_INDEX_TYPE, expected=snapshot):
+                return True
+    
+    @staticmethod
+    def _auto_index_type(n: int) -> str:
+        """Aday sayısına göre indeks türünü seç"""
+        if n < EXACT_MAX_CANDIDATES:
+            return "flat"
+        if n < FLAT_MAX_CANDIDATES:
+            return "sq8"
+        if n < HNSW_MAX_CANDIDATES:
+            return "hnsw"
+        return "ivfpq"
+    
+    @staticmethod
+    def _detect_index_type(index) -> str:
+        """Diskten yüklenen indeksin türünü belirle"""
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        if isinstance(index, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(index, faiss.IndexIVF):
+            return "ivfpq"
+        if isinstance(index, faiss.IndexScalarQuantizer):
+            return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+        return "flat"
+    
+    def _new_index(self, index_type: str, n: int):
+        """Boş FAISS indeksi oluştur (iç çarpım metriği; flat dışındakiler eğitim gerektirir)"""
+        # IDMap: satır numaraları silmeden sonra kaymaz, tek aday silinip yeniden eklenebilir
+        # (IVF etiketleri zaten kendisi saklar; HNSW silmeyi desteklemez)
+        if index_type == "flat":
+            return faiss.IndexIDMap(faiss.IndexFlatIP(self.dimension))
+        
+        if index_type == "fp16":
+            # Boyut başına 2 byte: tarama 2 kat daha az veri okur, kayıp ihmal edilebilir
+            return faiss.IndexIDMap(faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+            ))
+        
+        if index_type == "sq8":
+            # Boyut başına 1 byte: tarama 4 kat daha az veri okur
+            return faiss.IndexIDMap(faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            ))
+        
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWSQ(
+                self.dimension, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT
+            )
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            return index
+        
+        if index_type == "ivfpq":
+            nlist = 4 * int(n ** 0.5)
+            index = faiss.index_factory(
+                self.dimension, f"IVF{nlist},PQ{PQ_SUBQUANTIZERS}x8", faiss.METRIC_INNER_PRODUCT
+            )
+            index.nprobe = IVF_NPROBE
+            return index
+        
+        raise ValueError(f"Bilinmeyen indeks türü: {index_type}")
+    
+    @staticmethod
+    def _add_rows(index, vectors: np.ndarray, first_row: int):
+        """Vektörleri first_row'dan başlayan satır numaralarını etiket olarak kullanarak ekle"""
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF)):
+            index.add_with_ids(vectors, np.arange(first_row, first_row + len(vectors), dtype=np.int64))
+        else:
+            # HNSW ve eski (IDMap'siz) indekslerde silme olmadığından satırlar ardışıktır
+            index.add(vectors)
+    
+    def _supports_removal(self) -> bool:
+        """Tek aday indeksi yeniden oluşturmadan silinebilir/güncellenebilir mi"""
+        return not self._index_read_only and isinstance(self.index, (faiss.IndexIDMap, faiss.IndexIVF))
+    
+    @staticmethod
+    def _replaced(values: list, position: int, value) -> list:
+        """Listenin position'ı değişmiş kopyası; devam eden aramaların anlık görüntüsü bozulmaz"""
+        values = list(values)
+        values[position] = value
+        return values
+    
+    def _search_params(self, k: int, allowed: Optional[List[int]] = None):
+        """
+        İndeks türüne uygun arama parametreleri (gerekmiyorsa None)
+        
+        HNSW'de efSearch k ile büyür; aday listesi k'den kısa kalırsa graf
+        araması k sonuç döndüremez. allowed verilirse arama bu indeks
+        sıralarıyla sınırlanır.
+        """
+        kwargs = {}
+        if allowed is not None:
+            kwargs["sel"] = faiss.IDSelectorBatch(np.array(allowed, dtype=np.int64))
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=max(HNSW_EF_SEARCH, 4 * k), **kwargs)
+        if not kwargs:
+            return None
+        if self.index_type == "ivfpq":
+            return faiss.SearchParametersIVF(nprobe=IVF_NPROBE, **kwargs)
+        return faiss.SearchParameters(**kwargs)
+    
+    def _gpu_search_index(self):
+        """
+        Arama için indeksin GPU kopyası (çağıran self._lock'u tutmalı); GPU yoksa,
+        havuz FAISS_GPU_MIN_CANDIDATES'tan küçükse ya da tür GPU'da yoksa None
+        """
+        if (FAISS_NUM_GPUS == 0 or self.index_type not in ("flat", "ivfpq")
+                or self.index.ntotal < FAISS_GPU_MIN_CANDIDATES):
+            return None
+        if self._gpu_index is None:
+            try:
+                if self._gpu_resources is None:
+                    self._gpu_resources = faiss.StandardGpuResources()
+                co = faiss.GpuClonerOptions()
+                # PQ64 arama tabloları float32'de blok başına paylaşımlı belleğe (48 KiB) sığmaz;
+                # float16 tablolarla sığar. Flat vektörler tam hassasiyette kalır.
+                co.useFloat16 = self.index_type == "ivfpq"
+                gpu_index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, self.index, co)
+                if self.index_type == "ivfpq":
+                    faiss.GpuParameterSpace().set_index_parameter(gpu_index, "nprobe", IVF_NPROBE)
+                self._gpu_index = gpu_index
+                logger.info(f"FAISS indeksi GPU'ya kopyalandı ({self.index.ntotal} aday)")
+            except Exception as e:
+                logger.warning(f"İndeks GPU'ya kopyalanamadı, CPU'da aranacak: {e}")
+                # İndeks değişene kadar her aramada yeniden denenmez
+                self._gpu_index = False
+        return self._gpu_index or None
+    
+    def _embed_one(self, text: str) -> np.ndarray:
+        """Tek metnin embedding'ini LRU önbellekten al, yoksa hesapla"""
+        return self._embed_many([text])[0]
+    
+    @staticmethod
+    def _cache_key(text: str) -> bytes:
+        """L1 embedding önbelleği anahtarı (16 byte BLAKE2b özeti)"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    
+    def _remember(self, key: bytes, vector: np.ndarray) -> np.ndarray:
+        """Vektörü L1 önbelleğe ekle (çağıran self._lock'u tutmalı)"""
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        vector.setflags(write=False)  # Önbellekteki dizi paylaşılır, değiştirilmemeli
+        self._embed_cache[key] = vector
+        while len(self._embed_cache) > EMBED_CACHE_SIZE:
+            self._embed_cache.popitem(last=False)
+        return vector
+    
+    def _embed_many(self, texts: List[str]) -> np.ndarray:
+        """Metinlerin embedding matrisini oluştur; önbellekte olmayanlar tek seferde encode edilir"""
+        keys = [self._cache_key(text) for text in texts]
+        vectors: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._embed_cache.get(key)
+                if vector is not None:
+                    self._embed_cache.move_to_end(key)
+                    vectors[key] = vector
+        
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            encoded = self._encode(list(missing.values()))
+            with self._lock:
+                for key, vector in zip(missing.keys(), encoded):
+                    vectors[key] = self._remember(key, vector)
+        
+        return np.ascontiguousarray(np.stack([vectors[key] for key in keys]), dtype=np.float32)
+    
+    async def prefetch_query_embeddings(self, queries: List[str], db, executor=None):
+        """
+        Sorgu embedding'lerini L1 → MongoDB embedding önbelleği → model sırasıyla
+        hazırla; ardından gelen find_matches çağrıları L1'den okur
+        
+        Args:
+            queries: Ham sorgular (find_matches'e verilecek haliyle)
+            db: Embedding önbelleğine erişen Database örneği
+            executor: Model çalıştırılacak executor (None: varsayılan)
+        """
+        texts = [self._clean_query(query) for query in queries]
+        with self._lock:
+            missing = [text for text in texts if self._cache_key(text) not in self._embed_cache]
+        if not missing:
+            return
+        
+        hashes = [self.text_hash(text) for text in missing]
+        cached = await db.get_cached_embeddings(hashes)
+        
+        to_encode = []
+        with self._lock:
+            for text, text_hash in zip(missing, hashes):
+                if text_hash in cached:
+                    vector = np.frombuffer(cached[text_hash], dtype=np.float32)
+                    norm = np.linalg.norm(vector)
+                    self._remember(self._cache_key(text), vector / norm if norm > 0 else vector)
+                else:
+                    to_encode.append(text)
+        
+        if to_encode:
+            loop = asyncio.get_running_loop()
+            vectors = await loop.run_in_executor(executor, self._embed_many, to_encode)
+            await db.store_embeddings({
+                self.text_hash(text): vector.tobytes() for text, vector in zip(to_encode, vectors)
+            })
+    
+    def text_hash(self, text: str) -> str:
+        """MongoDB embedding önbelleği anahtarı (ONNX vektörleri ayrı anahtarlarla saklanır)"""
+        if isinstance(self.model, _OnnxEncoder):
+            text = "onnx-int8:" + text
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def add_candidate(self, candidate: Dict):
+        """
+        İndeksi yeniden oluşturmadan tek bir adayı indekse ekle
+        
+        Args:
+            candidate: Eklenecek aday, 'summary' alanına sahip olmalı
+        """
+        if self.index is None:
+            self.create_index([candidate])
+            return
+        
+        candidate_id = str(candidate.get("_id", ""))
+        if candidate_id in self._positions:
+            # Aynı ID ikinci satır olarak eklenmez; mevcut satır güncellenir
+            self.update_candidate(candidate_id, candidate)
+            return
+        
+        if self._index_read_only:
+            # Dosyadan eşlenmiş indekse ekleme yapılamaz; belleğe yeniden kur
+            self._rebuild(lambda candidates: candidates + [candidate])
+            return
+        
+        try:
+            summary = self._candidate_text(candidate)
+            
+            # Sadece yeni aday için embedding oluştur
+            embedding_array = np.nan_to_num(self._embed_one(summary)[np.newaxis, :])
+            skill_techs = self._candidate_techs(candidate)
+            profile = self._candidate_profile(candidate)
+            
+            with self._lock:
+                duplicate = candidate_id in self._positions
+                if not duplicate:
+                    # Sütunlar yerinde büyütülmez; devam eden aramaların anlık görüntüsü bozulmaz
+                    row = len(self._ids)
+                    self._add_rows(self.index, embedding_array, row)
+                    self._gpu_index = None
+                    self._positions = {**self._positions, candidate_id: row}
+                    self._ids = self._ids + [candidate_id]
+                    self.candidates = self.candidates + [candidate]
+                    self._skill_techs = self._skill_techs + [skill_techs]
+                    self._profiles = self._profiles + [profile]
+            if duplicate:
+                # Encode sırasında aynı ID başka bir çağrıyla eklendi
+                self.update_candidate(candidate_id, candidate)
+                return
+            logger.info(f"Aday indekse eklendi. Toplam aday: {self.index.ntotal}")
+            
+        except Exception as e:
+            logger.error(f"Aday ekleme hatası: {e}")
+            raise Exception(f"Aday indekse eklenemedi: {e}")
+    
+    def _candidate_text(self, candidate: Dict) -> str:
+        """Aday için embedding'e girecek metni döndür"""
+        summary = candidate.get("summary", "")
+        
+        # Summary boşsa diğer alanlardan metin oluştur
+        if not summary or len(summary.strip()) < 10:
+            summary = self._create_fallback_text(candidate)
+        
+        return summary
+    
     def _create_fallback_text(self, candidate: Dict) -> str:
         """Summary yoksa diğer alanlardan metin oluştur"""
         try:
@@ -122,7 +762,8 @@ class VectorMatcher:
             logger.warning(f"Fallback metin oluşturma hatası: {e}")
             return "Aday bilgisi"
         
-    def find_matches(self, query: str, k: int = 5, min_score: float = 0.0) -> List[Dict]:
+    def find_matches(self, query: str, k: int = 5, min_score: float = 0.0,
+                     candidate_ids: Optional[List[str]] = None, explain: bool = True) -> List[Dict]:
         """
         Bir sorgu için k en benzer adayı bul
         
@@ -130,165 +771,267 @@ class VectorMatcher:
             query: Arama sorgusu (iş tanımı)
             k: Döndürülecek maksimum aday sayısı
             min_score: Minimum eşleşme skoru (0-100 arası)
+            candidate_ids: Verilirse arama sadece bu adaylarla sınırlanır
+            explain: False ise açıklama metni oluşturulmaz (sonuçta "explanation" olmaz)
             
         Returns:
             Eşleşen adayların listesi
         """
+        return self.find_matches_batch([query], k, min_score, candidate_ids, explain)[0]
+    
+    def find_matches_batch(self, queries: List[str], k: int = 5, min_score: float = 0.0,
+                           candidate_ids: Optional[List[str]] = None, explain: bool = True) -> List[List[Dict]]:
+        """
+        Birden fazla sorgu için k en benzer adayı bul; sorgular tek seferde
+        encode edilir ve FAISS'te tek aramada taranır
+        
+        Args:
+            queries: Arama sorguları (iş tanımları)
+            k: Her sorgu için döndürülecek maksimum aday sayısı
+            min_score: Minimum eşleşme skoru (0-100 arası)
+            candidate_ids: Verilirse arama sadece bu adaylarla sınırlanır
+            explain: False ise açıklama metni oluşturulmaz
+            
+        Returns:
+            Her sorgu için eşleşen adayların listesi
+        """
         if not self.index:
             raise ValueError("İndeks oluşturulmamış. Önce create_index'i çağırın.")
         
-        if not query or len(query.strip()) < 3:
-            raise ValueError("Sorgu çok kısa veya boş")
+        for query in queries:
+            if not query or len(query.strip()) < 3:
+                raise ValueError("Sorgu çok kısa veya boş")
         
         try:
-            # Sorguyu temizle ve hazırla
-            cleaned_query = self._clean_query(query)
-            logger.info(f"Temizlenmiş sorgu: {cleaned_query[:200]}...")
+            # Sorguları temizle ve hazırla
+            cleaned_queries = [self._clean_query(query) for query in queries]
+            for cleaned_query in cleaned_queries:
+                logger.debug("Temizlenmiş sorgu: %.200s...", cleaned_query)
             
-            # Sorguyu vektöre çevir
-            query_vector = self.model.encode([cleaned_query])[0]
+            # Sorguları vektöre çevir
+            query_matrix = self._embed_many(cleaned_queries)
             
-            # NaN kontrolü
-            if np.isnan(query_vector).any():
-                logger.warning("Sorgu vektöründe NaN değerler tespit edildi, temizleniyor...")
-                query_vector = np.nan_to_num(query_vector)
+            # NaN/inf temizliği (_embed_many yeni dizi döndürür, yerinde değiştirilebilir)
+            np.nan_to_num(query_matrix, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
             
             # FAISS indeksinde ara
-            k_actual = min(k, self.index.ntotal)  # Mevcut aday sayısından fazla arama yapma
-            distances, indices = self.index.search(
-                np.array([query_vector]).astype('float32'), k_actual
-            )
+            with self._lock:
+                k_actual = min(k, self.index.ntotal)  # Mevcut aday sayısından fazla arama yapma
+                allowed = None
+                if candidate_ids is not None:
+                    # Ön filtreden geçen adaylar dışındakileri graf aramasında atla
+                    allowed = [self._positions[c] for c in candidate_ids if c in self._positions]
+                    if not allowed:
+                        return [[] for _ in queries]
+                    k_actual = min(k_actual, len(allowed))
+                params = self._search_params(k_actual, allowed)
+                similarities = indices = None
+                if min_score > 0 and self.index_type in ("flat", "fp16", "sq8"):
+                    # Eşiğin altındakiler FAISS içinde elenir, Python'a sadece geçenler gelir
+                    try:
+                        similarities, indices = self._range_top_k(query_matrix, min_score / 100.0, k_actual, params)
+                    except Exception as e:
+                        logger.warning(f"range_search kullanılamadı, normal aramaya geçiliyor: {e}")
+                if indices is None:
+                    # GPU kopyası aday filtresi (IDSelector) desteklemez; filtreli aramalar CPU'da kalır
+                    gpu_index = self._gpu_search_index() if allowed is None else None
+                    if gpu_index is not None:
+                        similarities, indices = gpu_index.search(query_matrix, k_actual)
+                    else:
+                        similarities, indices = self.index.search(query_matrix, k_actual, params=params)
+                ids = self._ids
+                skill_techs = self._skill_techs
+                profiles = self._profiles
             
-            # Sonuçları hazırla
-            results = []
-            for distance, idx in zip(distances[0], indices[0]):
-                if idx < len(self.candidates):
-                    candidate = self.candidates[idx]
-                    
-                    # Mesafeyi yüzdeye çevir (0-1 arası normalize et)
-                    # L2 mesafesi için: similarity = 1 / (1 + distance)
-                    similarity = 1 / (1 + distance)
-                    match_percentage = similarity * 100
-                    
-                    # Minimum skoru kontrol et
-                    if match_percentage < min_score:
-                        continue
-                    
-                    # Eksik becerileri bul
-                    missing_skills = self._find_missing_skills(
-                        query, candidate.get("cv_data", {}).get("skills", [])
-                    )
-                    
-                    # Eşleşme açıklaması oluştur
-                    explanation = self._generate_explanation(
-                        match_percentage, missing_skills, candidate
-                    )
-                    
-                    result = {
-                        "candidate_id": str(candidate.get("_id", "")),
-                        "match_percentage": round(match_percentage, 2),
-                        "missing_skills": missing_skills,
-                        "explanation": explanation,
-                        "distance": float(distance)  # Debug için
-                    }
-                    
-                    results.append(result)
-                    
-            # Sonuçları match_percentage'a göre sırala
-            results.sort(key=lambda x: x["match_percentage"], reverse=True)
-            
-            logger.info(f"{len(results)} eşleşme bulundu")
-            return results
+            # Birim vektörlerde iç çarpım kosinüs benzerliğidir; yüzdeler tüm matris için bir kez hesaplanır
+            percentages = 100.0 * np.maximum(similarities, 0.0)
+            
+            all_results = [
+                self._build_results(
+                    query, row_similarities, row_percentages, row_indices,
+                    ids, skill_techs, profiles, min_score, explain
+                )
+                for query, row_similarities, row_percentages, row_indices
+                in zip(queries, similarities, percentages, indices)
+            ]
+            
+            logger.info(f"{sum(len(r) for r in all_results)} eşleşme bulundu")
+            return all_results
             
         except Exception as e:
             logger.error(f"Eşleşme arama hatası: {e}")
             raise Exception(f"Eşleşme araması başarısız: {e}")
     
+    def _range_top_k(self, queries: np.ndarray, threshold: float, k: int, params=None):
+        """
+        Benzerliği threshold'u aşan adayları range_search ile bul ve her sorgu için
+        en iyi k tanesini search() ile aynı biçimde (azalan sıra, boşlar -1) döndür
+        
+        Sadece tam tarama indekslerinde kullanılır; graf/IVF indekslerinde
+        range_search ya desteklenmez ya da tüm listeleri taradığından pahalıdır.
+        """
+        # range_search sadece radius'tan büyük benzerlikleri döndürür; _build_results'taki
+        # >= min_score ile aynı sonucu vermesi için radius bir float32 adım aşağı çekilir
+        radius = float(np.nextafter(np.float32(threshold), np.float32(-np.inf)))
+        lims, sims, labels = self.index.range_search(queries, radius, params=params)
+        top_sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        top_labels = np.full((len(queries), k), -1, dtype=np.int64)
+        for q in range(len(queries)):
+            row_sims = sims[lims[q]:lims[q + 1]]
+            row_labels = labels[lims[q]:lims[q + 1]]
+            if len(row_sims) > k:
+                best = np.argpartition(-row_sims, k - 1)[:k]
+                row_sims, row_labels = row_sims[best], row_labels[best]
+            order = np.argsort(-row_sims, kind="stable")
+            top_sims[q, :len(order)] = row_sims[order]
+            top_labels[q, :len(order)] = row_labels[order]
+        return top_sims, top_labels
+    
+    def _build_results(self, query: str, similarities, percentages, indices, ids: List[str],
+                       skill_techs: List[frozenset], profiles: List[str], min_score: float,
+                       explain: bool = True) -> List[Dict]:
+        """Bir sorgunun FAISS sonuç satırından eşleşme listesini oluştur"""
+        # Sorgudaki teknolojiler aday başına değil, sorgu başına bir kez bulunur
+        query_techs = self._query_techs(query)
+        
+        # Geçersiz sıralar (-1) ve minimum skorun altındakiler tek maskeyle elenir
+        keep = (indices >= 0) & (indices < len(ids)) & (percentages >= min_score)
+        rounded = np.round(percentages[keep], 2)
+        # Uyumluluk seviyeleri sonuç başına if zinciri yerine tek searchsorted ile bulunur
+        levels = np.searchsorted(_LEVEL_THRESHOLDS, percentages[keep], side="right") if explain else None
+        
+        # Aynı teknoloji kümesine sahip adaylar için eksik beceriler sorgu başına bir kez hesaplanır
+        missing_by_techs: Dict[frozenset, List[str]] = {}
+        
+        results = []
+        for row, (idx, similarity, match_percentage, rounded_percentage) in enumerate(zip(
+            indices[keep].tolist(), similarities[keep].tolist(), percentages[keep].tolist(), rounded.tolist()
+        )):
+            # Eksik becerileri bul
+            candidate_techs = skill_techs[idx]
+            missing_skills = missing_by_techs.get(candidate_techs)
+            if missing_skills is None:
+                missing_skills = missing_by_techs[candidate_techs] = self._find_missing_skills(query_techs, candidate_techs)
+            
+            result = {
+                "candidate_id": ids[idx],
+                "match_percentage": rounded_percentage,
+                "missing_skills": missing_skills,
+                "similarity": similarity  # Debug için
+            }
+            if explain:
+                result["explanation"] = self._generate_explanation(
+                    match_percentage, missing_skills, profiles[idx], _LEVEL_LABELS[levels[row]]
+                )
+            
+            results.append(result)
+        
+        # FAISS iç çarpım sonuçları zaten azalan sırada; yüzde dönüşümü monoton ve
+        # maske sırayı bozmadığından ayrıca sıralamaya gerek yok
+        return results
+    
     def _clean_query(self, query: str) -> str:
         """Sorguyu temizle ve normalize et"""
         try:
             # Fazla boşlukları temizle
-            query = re.sub(r'\s+', ' ', query)
+            query = _WHITESPACE_RE.sub(' ', query)
             
             # HTML tag'lerini temizle (varsa)
-            query = re.sub(r'<[^>]+>', '', query)
+            query = _HTML_TAG_RE.sub('', query)
             
             # Gereksiz karakterleri temizle
-            query = re.sub(r'[^\w\s.,;:-]', '', query)
+            query = _JUNK_RE.sub('', query)
             
             return query.strip()
         except Exception as e:
             logger.warning(f"Sorgu temizleme hatası: {e}")
             return query
     
-    def _find_missing_skills(self, query: str, candidate_skills: List[str]) -> List[str]:
+    @staticmethod
+    def _techs_in(text: str) -> List[str]:
+        """Metinde kelime sınırıyla geçen teknoloji anahtar kelimeleri (TECH_KEYWORDS sırasıyla)"""
+        # Kelime sınırıyla: 'java' 'javascript' içinde, 'ai' 'detail' içinde bulunmuş sayılmaz
+        words = _word_text(text)
+        if _TECH_AUTOMATON is not None:
+            found = {tech for _, tech in _TECH_AUTOMATON.iter(words)}
+            return [tech for tech in _TECH_WORDS if tech in found]
+        return [tech for tech, tech_words in _TECH_WORDS.items() if tech_words in words]
+    
+    @classmethod
+    def _candidate_techs(cls, candidate: Dict) -> frozenset:
+        """Adayın becerilerinde geçen teknolojiler; indekslemede aday başına bir kez hesaplanır"""
+        return frozenset(cls._techs_in(' '.join(candidate.get("cv_data", {}).get("skills", []))))
+    
+    @classmethod
+    def _query_techs(cls, query: str) -> List[str]:
+        """Sorguda geçen teknoloji anahtar kelimelerini bul"""
+        return cls._techs_in(query)
+    
+    def _find_missing_skills(self, query_techs: List[str], candidate_techs: frozenset) -> List[str]:
         """
         Sorguda belirtilen ancak adayın becerilerinde olmayan becerileri bul
+        
+        Args:
+            query_techs: _query_techs ile sorgudan bir kez çıkarılmış teknolojiler
+            candidate_techs: _candidate_techs ile indekslemede hazırlanmış teknoloji kümesi
         """
         try:
-            # Sorgudan teknoloji/beceri anahtar kelimelerini çıkar
-            tech_keywords = [
-                'python', 'java', 'javascript', 'react', 'angular', 'vue', 'node.js',
-                'docker', 'kubernetes', 'aws', 'azure', 'git', 'sql', 'mongodb',
-                'machine learning', 'ai', 'data science', 'html', 'css', 'php',
-                'django', 'flask', 'spring', 'laravel', 'tensorflow', 'pytorch',
-                'opencv', 'pandas', 'numpy', 'scikit-learn', 'tableau', 'powerbi'
-            ]
-            
-            query_lower = query.lower()
-            candidate_skills_lower = [skill.lower() for skill in candidate_skills]
-            
-            # Sorguda geçen ve adayda olmayan teknolojiler
-            missing_skills = []
-            for tech in tech_keywords:
-                if tech in query_lower and tech not in ' '.join(candidate_skills_lower):
-                    missing_skills.append(tech.title())
-            
-            # Tekrar eden skills'leri temizle
-            missing_skills = list(set(missing_skills))
-            
-            # Maksimum 5 eksik beceri döndür
+            # Sorguda geçen ve adayda olmayan teknolojiler (en fazla 5); sonuç başına sadece küme aramaları
+            missing_skills = [tech.title() for tech in query_techs if tech not in candidate_techs]
             return missing_skills[:5]
             
         except Exception as e:
             logger.warning(f"Eksik beceri analizi hatası: {e}")
             return []
     
-    def _generate_explanation(self, match_percentage: float, missing_skills: List[str], candidate: Dict) -> str:
-        """Eşleşme için detaylı açıklama oluştur"""
+    @staticmethod
+    def _candidate_profile(candidate: Dict) -> str:
+        """Açıklamanın adaya özel kısmı (isim, ana beceriler, son pozisyonlar); aday başına bir kez oluşturulur"""
         try:
-            explanation_parts = []
-            
-            # Ana eşleşme skoru
-            if match_percentage >= 80:
-                explanation_parts.append("Çok yüksek uyumluluk")
-            elif match_percentage >= 60:
-                explanation_parts.append("Yüksek uyumluluk")
-            elif match_percentage >= 40:
-                explanation_parts.append("Orta seviye uyumluluk")
-            else:
-                explanation_parts.append("Düşük uyumluluk")
-            
-            # Aday hakkında kısa bilgi
+            profile_parts = []
             cv_data = candidate.get("cv_data", {})
             
             # İsim
             names = cv_data.get("names", [])
             if names:
-                explanation_parts.append(f"Aday: {names[0]}")
+                profile_parts.append(f"Aday: {names[0]}")
             
             # Temel beceriler
             skills = cv_data.get("skills", [])
             if skills:
                 key_skills = skills[:3]
-                explanation_parts.append(f"Ana beceriler: {', '.join(key_skills)}")
+                profile_parts.append(f"Ana beceriler: {', '.join(key_skills)}")
             
             # Deneyim özeti
             experience = cv_data.get("experience", [])
             if experience:
                 recent_positions = [exp.get("position", "") for exp in experience[:2] if exp.get("position")]
                 if recent_positions:
-                    explanation_parts.append(f"Son pozisyonlar: {', '.join(recent_positions)}")
+                    profile_parts.append(f"Son pozisyonlar: {', '.join(recent_positions)}")
+            
+            return " | ".join(profile_parts)
+        
+        except Exception as e:
+            logger.warning(f"Aday profil metni oluşturma hatası: {e}")
+            return ""
+    
+    def _generate_explanation(self, match_percentage: float, missing_skills: List[str], profile: str,
+                              level: Optional[str] = None) -> str:
+        """
+        Eşleşme için detaylı açıklama oluştur
+        
+        profile: _candidate_profile çıktısı; level: _build_results'ta toplu hesaplanan
+        uyumluluk etiketi (verilmezse match_percentage'tan bulunur)
+        """
+        try:
+            # Ana eşleşme skoru
+            if level is None:
+                level = _LEVEL_LABELS[int(np.searchsorted(_LEVEL_THRESHOLDS, match_percentage, side="right"))]
+            explanation_parts = [level]
+            
+            # Aday hakkında kısa bilgi
+            if profile:
+                explanation_parts.append(profile)
             
             # Eksik beceriler
             if missing_skills:
@@ -301,22 +1044,79 @@ class VectorMatcher:
             return f"Eşleşme oranı: %{match_percentage:.1f}"
     
     def save_index(self, path: str):
-        """FAISS indeksini diske kaydet"""
+        """
+        FAISS indeksini (path.faiss) ve paralel aday verilerini (path.meta) diske kaydet
+        
+        Args:
+            path: Uzantısız dosya yolu
+        """
         try:
-            if self.index:
-                faiss.write_index(self.index, path)
-                logger.info(f"İndeks kaydedildi: {path}")
-            else:
-                raise ValueError("Kaydedilecek indeks bulunamadı")
+            with self._lock:
+                if not self.index:
+                    raise ValueError("Kaydedilecek indeks bulunamadı")
+                faiss.write_index(self.index, f"{path}.faiss")
+                meta = {
+                    "model_name": self.model_name,
+                    "dimension": self.dimension,
+                    "index_type": self.index_type,
+                    "candidates": self.candidates,
+                    "positions": self._positions
+                }
+            with open(f"{path}.meta", "wb") as f:
+                pickle.dump(meta, f, protocol=5)
+            logger.info(f"İndeks kaydedildi: {path}")
         except Exception as e:
             logger.error(f"İndeks kaydetme hatası: {e}")
             raise Exception(f"İndeks kaydetme başarısız: {e}")
     
-    def load_index(self, path: str):
-        """FAISS indeksini diskten yükle"""
+    def load_index(self, path: str, mmap: bool = False):
+        """
+        save_index ile kaydedilmiş indeksi ve aday verilerini yükle (yeniden encode yok)
+        
+        Args:
+            path: Uzantısız dosya yolu
+            mmap: True ise vektörler belleğe okunmaz, dosyadan eşlenir; açılış
+                indeks boyutundan bağımsızdır ancak indeks salt okunur olur
+                (yeni aday eklemek tam yeniden oluşturma gerektirir)
+        """
         try:
-            self.index = faiss.read_index(path)
-            logger.info(f"İndeks yüklendi: {path}")
+            with open(f"{path}.meta", "rb") as f:
+                meta = pickle.load(f)
+            
+            # Sorgular indeksi kuran modelle encode edilmeli; farklıysa o model yüklenir
+            model_name = meta.get("model_name", self.model_name)
+            if model_name != self.model_name:
+                logger.info(f"İndeks {model_name} modeliyle oluşturulmuş, model değiştiriliyor")
+                model = _load_model(model_name)
+                with self._lock:
+                    self.model = model
+                    self.model_name = model_name
+                    self.dimension = model.get_sentence_embedding_dimension()
+                    self._embed_cache.clear()  # Önceki modelin vektörleri
+            
+            if meta["dimension"] != self.dimension:
+                raise ValueError(f"İndeks boyutu ({meta['dimension']}) model boyutuyla ({self.dimension}) uyuşmuyor")
+            
+            flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+            index = faiss.read_index(f"{path}.faiss", flags)
+            if index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                # Skorlar kosinüs benzerliği varsayılarak yüzdeye çevrilir; L2 indeksi yeniden oluşturulmalı
+                raise ValueError("İndeks iç çarpım (kosinüs) metriği kullanmıyor; create_index ile yeniden oluşturun")
+            with self._lock:
+                self.index = index
+                self.index_type = meta.get("index_type") or self._detect_index_type(index)
+                self.candidates = meta["candidates"]
+                self._ids = [str(c.get("_id", "")) if c is not None else None for c in self.candidates]
+                # positions alanı olmayan eski meta dosyalarında satır haritası ID'lerden kurulur
+                positions = meta.get("positions")
+                if positions is None:
+                    positions = {cid: i for i, cid in enumerate(self._ids) if cid is not None}
+                self._positions = positions
+                self._skill_techs = [self._candidate_techs(c) if c is not None else None for c in self.candidates]
+                self._profiles = [self._candidate_profile(c) if c is not None else None for c in self.candidates]
+                self._index_read_only = mmap
+                self._gpu_index = None
+            logger.info(f"İndeks yüklendi ({self.index_type}, {index.ntotal} aday): {path}")
         except Exception as e:
             logger.error(f"İndeks yükleme hatası: {e}")
             raise Exception(f"İndeks yükleme başarısız: {e}")
@@ -329,8 +1129,10 @@ class VectorMatcher:
         return {
             "status": "ready",
             "total_candidates": self.index.ntotal,
+            "index_type": self.index_type,
             "dimension": self.dimension,
-            "model_name": self.model._modules['0'].auto_model.name_or_path if hasattr(self.model, '_modules') else "unknown"
+            "model_name": self.model_name,
+            "embedding_backend": "onnx" if isinstance(self.model, _OnnxEncoder) else "torch"
         }
     
     def batch_search(self, queries: List[str], k: int = 5) -> List[List[Dict]]:
@@ -348,10 +1150,8 @@ class VectorMatcher:
             raise ValueError("İndeks oluşturulmamış")
         
         try:
-            results = []
-            for query in queries:
-                matches = self.find_matches(query, k)
-                results.append(matches)
+            # Sorgular tek encode çağrısıyla ve tek FAISS aramasıyla işlenir
+            results = self.find_matches_batch(queries, k)
             
             logger.info(f"{len(queries)} sorgu için toplu arama tamamlandı")
             return results
@@ -362,50 +1162,104 @@ class VectorMatcher:
     
     def update_candidate(self, candidate_id: str, new_candidate_data: Dict):
         """
-        Belirli bir adayın bilgilerini güncelle ve indeksi yeniden oluştur
+        Belirli bir adayın bilgilerini güncelle; sadece bu aday yeniden encode edilir
+        (HNSW ya da salt okunur indekste tüm indeks yeniden oluşturulur)
         
         Args:
             candidate_id: Güncellenecek adayın ID'si
             new_candidate_data: Yeni aday verisi
         """
         try:
-            # Mevcut adayları güncelle
-            for i, candidate in enumerate(self.candidates):
-                if str(candidate.get("_id", "")) == candidate_id:
-                    self.candidates[i] = new_candidate_data
-                    break
+            # Model çalışırken aramalar beklemesin diye encode kilit dışında
+            text = self._candidate_text(new_candidate_data)
+            vector = np.nan_to_num(self._embed_one(text)[np.newaxis, :])
+            
+            with self._lock:
+                position = self._positions.get(candidate_id)
+                if position is None:
+                    logger.warning(f"Aday {candidate_id} bulunamadı")
+                    return
+                
+                in_place = self._supports_removal()
+                if in_place:
+                    # Aynı satır numarasıyla sil ve yeniden ekle
+                    label = np.array([position], dtype=np.int64)
+                    self.index.remove_ids(label)
+                    self.index.add_with_ids(vector, label)
+                    self._gpu_index = None
+                    self.candidates = self._replaced(self.candidates, position, new_candidate_data)
+                    self._skill_techs = self._replaced(self._skill_techs, position, self._candidate_techs(new_candidate_data))
+                    self._profiles = self._replaced(self._profiles, position, self._candidate_profile(new_candidate_data))
             
-            # İndeksi yeniden oluştur
-            self.create_index(self.candidates)
-            logger.info(f"Aday {candidate_id} güncellendi ve indeks yenilendi")
+            if in_place:
+                logger.info(f"Aday {candidate_id} indekste güncellendi")
+                return
             
+            # Yeniden kurulum kilit dışında; bu adayın vektörü tekrar hesaplanmaz
+            def change(candidates):
+                position = self._positions.get(candidate_id)
+                return None if position is None else self._replaced(candidates, position, new_candidate_data)
+            
+            if self._rebuild(change, known={text: vector[0]}):
+                logger.info(f"Aday {candidate_id} güncellendi ve indeks yenilendi")
+            else:
+                logger.warning(f"Aday {candidate_id} bulunamadı")
+        
         except Exception as e:
             logger.error(f"Aday güncelleme hatası: {e}")
             raise Exception(f"Aday güncelleme başarısız: {e}")
     
     def remove_candidate(self, candidate_id: str):
         """
-        Belirli bir adayı kaldır ve indeksi yeniden oluştur
+        Belirli bir adayı indeksten kaldır (HNSW ya da salt okunur indekste
+        tüm indeks yeniden oluşturulur)
         
         Args:
             candidate_id: Kaldırılacak adayın ID'si
         """
         try:
-            # Adayı listeden çıkar
-            original_count = len(self.candidates)
-            self.candidates = [c for c in self.candidates if str(c.get("_id", "")) != candidate_id]
-            
-            if len(self.candidates) < original_count:
-                # İndeksi yeniden oluştur
-                if self.candidates:
-                    self.create_index(self.candidates)
-                else:
-                    self.index = None
+            with self._lock:
+                position = self._positions.get(candidate_id)
+                if position is None:
+                    logger.warning(f"Aday {candidate_id} bulunamadı")
+                    return
                 
-                logger.info(f"Aday {candidate_id} kaldırıldı ve indeks güncellendi")
-            else:
-                logger.warning(f"Aday {candidate_id} bulunamadı")
+                rebuild = False
+                if self.index.ntotal <= 1:
+                    self.index = None
+                    self._gpu_index = None
+                    self.index_type = None
+                    self.candidates = []
+                    self._ids = []
+                    self._positions = {}
+                    self._skill_techs = []
+                    self._profiles = []
+                elif not self._supports_removal():
+                    rebuild = True
+                else:
+                    # Satır boş kalır; diğer adayların satır numaraları değişmez
+                    self.index.remove_ids(np.array([position], dtype=np.int64))
+                    self._gpu_index = None
+                    self.candidates = self._replaced(self.candidates, position, None)
+                    self._ids = self._replaced(self._ids, position, None)
+                    self._skill_techs = self._replaced(self._skill_techs, position, None)
+                    self._profiles = self._replaced(self._profiles, position, None)
+                    positions = dict(self._positions)
+                    del positions[candidate_id]
+                    self._positions = positions
+            
+            if rebuild:
+                # Yeniden kurulum kilit dışında; aramalar sadece yeni indeks devreye alınırken bekler
+                def change(candidates):
+                    position = self._positions.get(candidate_id)
+                    return None if position is None else self._replaced(candidates, position, None)
                 
+                if not self._rebuild(change):
+                    logger.warning(f"Aday {candidate_id} bulunamadı")
+                    return
+            
+            logger.info(f"Aday {candidate_id} kaldırıldı ve indeks güncellendi")
+            
         except Exception as e:
             logger.error(f"Aday kaldırma hatası: {e}")
-            raise Exception(f"Aday kaldırma başarısız: {e}")
\ No newline at end of file
+            raise Exception(f"Aday kaldırma başarısız: {e}")